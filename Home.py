@@ -1,366 +1,393 @@
+import math
+from contextlib import nullcontext
 import streamlit as st
 import pandas as pd
-import yfinance as yf
+import engine
 import options
-import utils
+import instrumentation
+from instrumentation import span
+from chain_store import bytes_per_contract, get_shared_store
 
 HOME_PAGE = "Home.py"
 AARR_PAGE = "pages/Final Market Price vs AARR.py"
 
+PAGE_SIZES = [25, 50, 100, 250]
+
+# Badge colors for call types
+CALL_TYPE_COLORS = {
+    "🔴 Deep ITM": "#ff4444",
+    "🟠 ITM": "#ff8800",
+    "🟡 ATM": "#ffbb00",
+    "🟢 OTM": "#44ff44",
+    "🟢 Deep OTM": "#00ff88",
+}
+
+def aarr_color(aarr):
+    return "#44ff44" if aarr >= 20 else "#ffbb00" if aarr >= 10 else "#A0A0A0"
+
+def safety_badge(safety_score):
+    # Color code safety: green (8-10), yellow (5-7), red (0-4)
+    if pd.isna(safety_score):
+        return "–"
+    emoji = "🟢" if safety_score >= 8 else "🟡" if safety_score >= 5 else "🔴"
+    return f"{emoji} {safety_score:.1f}/10"
+
+def style_results_page(page_chain):
+    """Display table for one page of results (formatting cost scales with the page, not the chain)."""
+    view = pd.DataFrame({
+        "Type": page_chain["call_type"],
+        "Strike": page_chain["strike"],
+        "Premium": page_chain["premium"],
+        "Days": page_chain["days_to_expiration"],
+        "Expires": page_chain["expiration"].dt.date,
+        "Max AARR": page_chain["max_aarr"],
+        "Expected AARR": page_chain.get("expected_aarr", pd.Series(-9999, index=page_chain.index)),  # NOTE this is the -9999 expected AARR fallback
+        "Safety": page_chain.get("safety_score", pd.Series(0.0, index=page_chain.index)).map(safety_badge),
+    })
+    # Monte Carlo expected AARR methods also report the probability of a loss
+    if "prob_loss" in page_chain.columns:
+        view.insert(view.columns.get_loc("Expected AARR") + 1, "P(Loss)", page_chain["prob_loss"] * 100)
+    return (
+        view.style
+        .format({"Strike": "${:.2f}", "Premium": "${:.2f}", "Max AARR": "{:.1f}%", "Expected AARR": "{:.1f}%",
+                 "P(Loss)": "{:.0f}%"})
+        .map(lambda call_type: f"color: {CALL_TYPE_COLORS.get(call_type, '#00ff88')}; font-weight: bold", subset=["Type"])
+        .map(lambda aarr: f"color: {aarr_color(aarr)}; font-weight: bold", subset=["Max AARR", "Expected AARR"])
+    )
+
 st.set_page_config(page_title="Covered Call Viewer", layout="wide", page_icon="📈")
 
 st.title("📈 Covered Call Analyzer")
 st.markdown("Find optimal covered call opportunities with probability-weighted analysis")
 
-# Ticker input
-# col_ticker, col_price, col_vol = st.columns([2, 1, 1])
-# with col_ticker:
-#     ticker = st.text_input("Stock Ticker", value="AAPL", key="ticker_input")
-# Ticker input
-col_ticker, col_price, col_vol = st.columns([2, 1, 1])
-with col_ticker:
-    # Initialize session state for ticker if not exists
-    if "saved_ticker" not in st.session_state:
-        st.session_state.saved_ticker = "AAPL"
-    
-    ticker = st.text_input("Stock Ticker", 
-                          value=st.session_state.saved_ticker, 
-                          key="ticker_input",
-                          on_change=lambda: st.session_state.update({"saved_ticker": st.session_state.ticker_input}))
-
-# Show current market price and volatility
-market_price = None
-volatility = None
-
-with col_price:
-    if ticker:
-        with st.spinner("Loading..."):
-            market_price = utils.get_market_price(ticker)
-        if market_price:
-            st.metric("Current Price", f"${market_price:.2f}")
-        else:
-            st.warning("Unable to fetch price")
-
-# Historical volatility
-with col_vol:
-    if ticker:
-        with st.spinner("Loading..."):
-            volatility = utils.get_historical_volatility(ticker)
-        if volatility:
-            st.metric("30d Volatility", f"{volatility*100:.1f}%")
-        else:
-            st.info("No volatility data")
-
-# Implied volatility (commented out for now)
-# with col_vol:
-#     if ticker:
-#         with st.spinner("Loading..."):
-#             # Try IV first, fall back to HV
-#             volatility = utils.get_implied_volatility_from_options(ticker, 30)
-#             if not volatility:
-#                 volatility = utils.get_historical_volatility(ticker)
-#         if volatility:
-#             st.metric("Implied Vol", f"{volatility*100:.1f}%")
-
-st.divider()
-
-# Filters
-st.subheader("🔍 Filters")
-
-# Initialize filter defaults in session state
-if "saved_first_exp" not in st.session_state:
-    st.session_state["saved_first_exp"] = 30
-if "saved_last_exp" not in st.session_state:
-    st.session_state["saved_last_exp"] = 90
-if "min_strike_price" not in st.session_state:
-    st.session_state["min_strike_price"] = 0.0
-if "max_strike_price" not in st.session_state:
-    st.session_state["max_strike_price"] = 99999.0
-if "min_premium" not in st.session_state:
-    st.session_state["min_premium"] = 0.0
-if "max_premium" not in st.session_state:
-    st.session_state["max_premium"] = 99999.0
-if "min_aarr_filter" not in st.session_state:
-    st.session_state["min_aarr_filter"] = 15.0
-if "max_aarr_filter" not in st.session_state:
-    st.session_state["max_aarr_filter"] = 200.0
-if "call_type_filter" not in st.session_state:
-    st.session_state["call_type_filter"] = ["🔴 Deep ITM", "🟠 ITM", "🟡 ATM", "🟢 OTM", "🟢 Deep OTM"]
-if "sort_by" not in st.session_state:
-    st.session_state["sort_by"] = "AARR (Highest)"
-
-col1, col2 = st.columns(2)
-with col1:
-    first_exp = st.slider("First Expiration (days)", 0, 180, 
-                         st.session_state["saved_first_exp"],
-                         key="first_exp_slider",
-                         on_change=lambda: st.session_state.update({"saved_first_exp": st.session_state["first_exp_slider"]}))
-with col2:
-    last_exp = st.slider("Last Expiration (days)", first_exp, 365, 
-                        st.session_state["saved_last_exp"],
-                        key="last_exp_slider",
-                        on_change=lambda: st.session_state.update({"saved_last_exp": st.session_state["last_exp_slider"]}))
-
-with st.expander("Advanced Filters", expanded=False):
-    col3, col4 = st.columns(2)
-    with col3:
-        st.markdown("**Minimum Values**")
-        min_strike_price = st.number_input("Min Strike Price", 
-                                           value=st.session_state["min_strike_price"], 
-                                           format="%.2f",
-                                           key="min_strike_price_input",
-                                           on_change=lambda: st.session_state.update({"min_strike_price": st.session_state["min_strike_price_input"]}))
-        min_premium = st.number_input("Min Premium", 
-                                      value=st.session_state["min_premium"], 
-                                      format="%.2f",
-                                      key="min_premium_input",
-                                      on_change=lambda: st.session_state.update({"min_premium": st.session_state["min_premium_input"]}))
-        min_aarr_filter = st.number_input("Min AARR %", 
-                                   value=st.session_state["min_aarr_filter"], 
-                                   format="%.2f",
-                                   key="min_aarr_input",
-                                   on_change=lambda: st.session_state.update({"min_aarr_filter": st.session_state["min_aarr_input"]}))
-    with col4:
-        st.markdown("**Maximum Values**")
-        max_strike_price = st.number_input("Max Strike Price", 
-                                           value=st.session_state["max_strike_price"], 
-                                           format="%.2f",
-                                           key="max_strike_price_input",
-                                           on_change=lambda: st.session_state.update({"max_strike_price": st.session_state["max_strike_price_input"]}))
-        max_premium = st.number_input("Max Premium", 
-                                      value=st.session_state["max_premium"], 
-                                      format="%.2f",
-                                      key="max_premium_input",
-                                      on_change=lambda: st.session_state.update({"max_premium": st.session_state["max_premium_input"]}))
-        max_aarr_filter = st.number_input("Max AARR %", 
-                                   value=st.session_state["max_aarr_filter"], 
-                                   format="%.2f",
-                                   key="max_aarr_input",
-                                   on_change=lambda: st.session_state.update({"max_aarr_filter": st.session_state["max_aarr_input"]}))
+# Optional debug panel: stage timings of each run (see instrumentation.py)
+if "saved_debug_panel" not in st.session_state:
+    st.session_state["saved_debug_panel"] = False
+if "saved_debug_memory" not in st.session_state:
+    st.session_state["saved_debug_memory"] = False
+with st.sidebar:
+    debug_panel = st.toggle("🛠 Debug panel", value=st.session_state["saved_debug_panel"], key="debug_panel_input",
+                            on_change=lambda: st.session_state.update({"saved_debug_panel": st.session_state["debug_panel_input"]}))
+    debug_memory = st.toggle("Trace memory peaks (slower)", value=st.session_state["saved_debug_memory"],
+                             key="debug_memory_input", disabled=not debug_panel,
+                             on_change=lambda: st.session_state.update({"saved_debug_memory": st.session_state["debug_memory_input"]}))
 
-    st.divider()
+def main():
+    """The page, run inside the debug trace below."""
+    # Ticker input
+    # col_ticker, col_price, col_vol = st.columns([2, 1, 1])
+    # with col_ticker:
+    #     ticker = st.text_input("Stock Ticker", value="AAPL", key="ticker_input")
+    # Ticker input
+    col_ticker, col_price, col_vol = st.columns([2, 1, 1])
+    with col_ticker:
+        # Initialize session state for ticker if not exists
+        if "saved_ticker" not in st.session_state:
+            st.session_state.saved_ticker = "AAPL"
     
-    # Call type filter
-    st.markdown("**Filter by Call Type**")
-    call_type_filter = st.multiselect(
-        "Show only these types:", 
-        ["🔴 Deep ITM", "🟠 ITM", "🟡 ATM", "🟢 OTM", "🟢 Deep OTM"],
-        default=st.session_state["call_type_filter"],
-        key="call_type_filter_input",
-        on_change=lambda: st.session_state.update({"call_type_filter": st.session_state["call_type_filter_input"]})
-    )
+        ticker = st.text_input("Stock Ticker", 
+                              value=st.session_state.saved_ticker, 
+                              key="ticker_input",
+                              on_change=lambda: st.session_state.update({"saved_ticker": st.session_state.ticker_input}))
 
-# Sort option
-sort_by = st.selectbox("Sort by", [
-    "AARR (Highest)", 
-    "AARR (Lowest)", 
-    "Premium (Highest)", 
-    "Days to Expiry (Soonest)",
-    "Safety Score (Safest First)"
-],
-    index=["AARR (Highest)", "AARR (Lowest)", "Premium (Highest)", 
-           "Days to Expiry (Soonest)", "Safety Score (Safest First)"].index(st.session_state["sort_by"]),
-    key="sort_by_input",
-    on_change=lambda: st.session_state.update({"sort_by": st.session_state["sort_by_input"]})
-)
-
-# Fetch button
-if st.button("🔎 Fetch Covered Calls", type="primary", use_container_width=True):
-    with st.spinner("Fetching options data..."):
-        try:
-            chain = options.fetch_options_chain(ticker, first_expiration=first_exp, last_expiration=last_exp)
-            
-            # Add call type classification
-            def classify_call(row):
-                strike = row['strike']
-                if strike < market_price * 0.95:
-                    return "🔴 Deep ITM"
-                elif strike < market_price:
-                    return "🟠 ITM"
-                elif strike <= market_price * 1.05:
-                    return "🟡 ATM"
-                elif strike <= market_price * 1.15:
-                    return "🟢 OTM"
-                else:
-                    return "🟢 Deep OTM"
-            
-            chain['call_type'] = chain.apply(classify_call, axis=1)
-            
-            # Calculate safety score (higher = safer)
-            # Safety = premium yield + inverse of how far strike is from current price
+    # Show current market price and volatility
+    market_price = None
+    volatility = None
+
+    with col_price:
+        if ticker:
+            with st.spinner("Loading..."), span("home.market_price"):
+                market_price = engine.market_price(ticker)
+            if market_price:
+                st.metric("Current Price", f"${market_price:.2f}")
+            else:
+                st.warning("Unable to fetch price")
+
+    # Historical volatility
+    with col_vol:
+        if ticker:
+            with st.spinner("Loading..."), span("home.volatility"):
+                volatility = engine.historical_volatility(ticker)
             if volatility:
-                # Calculate safety score using probability-weighted analysis
-                # Calculate raw safety scores
-                chain['safety_score_raw'] = chain.apply(
-                    lambda row: utils.calculate_safety_score(
-                        strike=row['strike'],
-                        premium=row['premium'],
-                        market_price=market_price,
-                        days_to_expiry=row['days_to_expiration'],
-                        volatility=volatility
-                    ),
-                    axis=1
-                )
-                # Normalize to 0-10 scale
-                chain['safety_score'] = chain['safety_score_raw'].apply(
-                    lambda x: utils.normalize_safety_score(x, chain['safety_score_raw'].values)
-                )
+                st.metric("30d Volatility", f"{volatility*100:.1f}%")
+            else:
+                st.info("No volatility data")
+
+    # Implied volatility (commented out for now)
+    # with col_vol:
+    #     if ticker:
+    #         with st.spinner("Loading..."):
+    #             # Try IV first, fall back to HV
+    #             volatility = utils.get_implied_volatility_from_options(ticker, 30)
+    #             if not volatility:
+    #                 volatility = engine.historical_volatility(ticker)
+    #         if volatility:
+    #             st.metric("Implied Vol", f"{volatility*100:.1f}%")
 
-                # Store BOTH raw and normalized
-                st.session_state["all_safety_scores_raw"] = chain['safety_score_raw'].values
-                st.session_state["all_safety_scores"] = chain['safety_score'].values  # Add this
-
-            
-            # Apply call type filter
-            if call_type_filter:
-                chain = chain[chain['call_type'].isin(call_type_filter)]
-            
-            # Apply other filters
-            if min_strike_price > 0:
-                chain = chain[chain["strike"] >= min_strike_price]
-            if max_strike_price > 0:
-                chain = chain[chain["strike"] <= max_strike_price]
-            if min_premium > 0:
-                chain = chain[chain["premium"] >= min_premium]
-            if max_premium > 0:
-                chain = chain[chain["premium"] <= max_premium]
-            if min_aarr_filter > 0:
-                chain = chain[chain["max_aarr"] >= min_aarr_filter]
-            if max_aarr_filter > 0:
-                chain = chain[chain["max_aarr"] <= max_aarr_filter]
-
-            # Sort
-            # if sort_by == "AARR (Highest)":
-            #     chain = chain.sort_values("aarr", ascending=False)
-            # elif sort_by == "AARR (Lowest)":
-            #     chain = chain.sort_values("aarr", ascending=True)
-            # Sort
-            if sort_by == "AARR (Highest)":
-                sort_col = 'expected_aarr' if 'expected_aarr' in chain.columns else 'aarr'
-                chain = chain.sort_values(sort_col, ascending=False)
-            elif sort_by == "AARR (Lowest)":
-                sort_col = 'expected_aarr' if 'expected_aarr' in chain.columns else 'aarr'
-                chain = chain.sort_values(sort_col, ascending=True)
-            elif sort_by == "Premium (Highest)":
-                chain = chain.sort_values("premium", ascending=False)
-            elif sort_by == "Days to Expiry (Soonest)":
-                chain = chain.sort_values("days_to_expiration", ascending=True)
-            elif sort_by == "Safety Score (Safest First)":
-                chain = chain.sort_values("safety_score", ascending=False)
-
-            chain.reset_index(drop=True, inplace=True)
-            st.session_state["options_chain"] = chain
-            st.session_state["ticker"] = ticker
-            st.session_state["stock_price"] = market_price
-            st.session_state["volatility"] = volatility
-
-            st.success(f"✅ Found {len(chain)} covered calls")
-
-        except Exception as e:
-            st.error(f"❌ Error fetching options: {e}")
-
-# Render results
-if "options_chain" in st.session_state:
-    chain = st.session_state["options_chain"]
-    ticker = st.session_state["ticker"]
-    
     st.divider()
-    
-    # Summary stats
-    col1, col2, col3, col4 = st.columns(4)
+
+    # Filters
+    st.subheader("🔍 Filters")
+
+    # Initialize filter defaults in session state
+    if "saved_first_exp" not in st.session_state:
+        st.session_state["saved_first_exp"] = 30
+    if "saved_last_exp" not in st.session_state:
+        st.session_state["saved_last_exp"] = 90
+    if "min_strike_price" not in st.session_state:
+        st.session_state["min_strike_price"] = 0.0
+    if "max_strike_price" not in st.session_state:
+        st.session_state["max_strike_price"] = 99999.0
+    if "min_premium" not in st.session_state:
+        st.session_state["min_premium"] = 0.0
+    if "max_premium" not in st.session_state:
+        st.session_state["max_premium"] = 99999.0
+    if "min_aarr_filter" not in st.session_state:
+        st.session_state["min_aarr_filter"] = 15.0
+    if "max_aarr_filter" not in st.session_state:
+        st.session_state["max_aarr_filter"] = 200.0
+    if "call_type_filter" not in st.session_state:
+        st.session_state["call_type_filter"] = options.CALL_TYPES
+    if "sort_by" not in st.session_state:
+        st.session_state["sort_by"] = "AARR (Highest)"
+    if "saved_expected_aarr_model" not in st.session_state:
+        st.session_state["saved_expected_aarr_model"] = "Lognormal (grid)"
+
+    col1, col2 = st.columns(2)
     with col1:
-        st.metric("Results", len(chain))
+        first_exp = st.slider("First Expiration (days)", 0, 180, 
+                             st.session_state["saved_first_exp"],
+                             key="first_exp_slider",
+                             on_change=lambda: st.session_state.update({"saved_first_exp": st.session_state["first_exp_slider"]}))
     with col2:
-        # st.metric("Avg AARR", f"{chain['aarr'].mean():.1f}%")
-        if 'expected_aarr' in chain.columns:
-            st.metric("Avg Expected AARR", f"{chain['expected_aarr'].mean():.1f}%")
-        else:
-            st.metric("Avg Max AARR", f"{chain['max_aarr'].mean():.1f}%")
-    with col3:
-        st.metric("Avg Premium", f"${chain['premium'].mean():.2f}")
-    with col4:
-        st.metric("Avg Days", f"{chain['days_to_expiration'].mean():.0f}")
-    
-    st.divider()
+        last_exp = st.slider("Last Expiration (days)", first_exp, 365, 
+                            st.session_state["saved_last_exp"],
+                            key="last_exp_slider",
+                            on_change=lambda: st.session_state.update({"saved_last_exp": st.session_state["last_exp_slider"]}))
+
+    with st.expander("Advanced Filters", expanded=False):
+        col3, col4 = st.columns(2)
+        with col3:
+            st.markdown("**Minimum Values**")
+            min_strike_price = st.number_input("Min Strike Price", 
+                                               value=st.session_state["min_strike_price"], 
+                                               format="%.2f",
+                                               key="min_strike_price_input",
+                                               on_change=lambda: st.session_state.update({"min_strike_price": st.session_state["min_strike_price_input"]}))
+            min_premium = st.number_input("Min Premium", 
+                                          value=st.session_state["min_premium"], 
+                                          format="%.2f",
+                                          key="min_premium_input",
+                                          on_change=lambda: st.session_state.update({"min_premium": st.session_state["min_premium_input"]}))
+            min_aarr_filter = st.number_input("Min AARR %", 
+                                       value=st.session_state["min_aarr_filter"], 
+                                       format="%.2f",
+                                       key="min_aarr_input",
+                                       on_change=lambda: st.session_state.update({"min_aarr_filter": st.session_state["min_aarr_input"]}))
+        with col4:
+            st.markdown("**Maximum Values**")
+            max_strike_price = st.number_input("Max Strike Price", 
+                                               value=st.session_state["max_strike_price"], 
+                                               format="%.2f",
+                                               key="max_strike_price_input",
+                                               on_change=lambda: st.session_state.update({"max_strike_price": st.session_state["max_strike_price_input"]}))
+            max_premium = st.number_input("Max Premium", 
+                                          value=st.session_state["max_premium"], 
+                                          format="%.2f",
+                                          key="max_premium_input",
+                                          on_change=lambda: st.session_state.update({"max_premium": st.session_state["max_premium_input"]}))
+            max_aarr_filter = st.number_input("Max AARR %", 
+                                       value=st.session_state["max_aarr_filter"], 
+                                       format="%.2f",
+                                       key="max_aarr_input",
+                                       on_change=lambda: st.session_state.update({"max_aarr_filter": st.session_state["max_aarr_input"]}))
+
+        st.divider()
     
-    # Export button
-    csv = chain.to_csv(index=False)
-    st.download_button(
-        label="📥 Download Results as CSV",
-        data=csv,
-        file_name=f"{ticker}_covered_calls.csv",
-        mime="text/csv",
+        # Call type filter
+        st.markdown("**Filter by Call Type**")
+        call_type_filter = st.multiselect(
+            "Show only these types:", 
+            options.CALL_TYPES,
+            default=st.session_state["call_type_filter"],
+            key="call_type_filter_input",
+            on_change=lambda: st.session_state.update({"call_type_filter": st.session_state["call_type_filter_input"]})
+        )
+
+        st.divider()
+
+        # Price model behind the Expected AARR column (Monte Carlo models also add P(Loss))
+        expected_aarr_model = st.selectbox(
+            "Expected AARR model",
+            list(options.EXPECTED_AARR_METHODS),
+            index=list(options.EXPECTED_AARR_METHODS).index(st.session_state["saved_expected_aarr_model"]),
+            key="expected_aarr_model_input",
+            on_change=lambda: st.session_state.update({"saved_expected_aarr_model": st.session_state["expected_aarr_model_input"]})
+        )
+        expected_aarr_method = options.EXPECTED_AARR_METHODS[expected_aarr_model]
+
+    # Sort option
+    sort_by = st.selectbox("Sort by", options.SORT_OPTIONS,
+        index=options.SORT_OPTIONS.index(st.session_state["sort_by"]),
+        key="sort_by_input",
+        on_change=lambda: st.session_state.update({"sort_by": st.session_state["sort_by_input"]})
     )
+
+    # The enriched, unfiltered chain is kept per (ticker, expiration window, expected AARR model). Filters and sorting
+    # apply to it instantly on every rerun; it's only rebuilt when one of those changes.
+    dataset_key = (ticker.upper(), first_exp, last_exp, expected_aarr_method) if ticker else None
+    fetch_clicked = st.button("🔎 Fetch Covered Calls", type="primary", use_container_width=True)
+    window_changed = "chain_store_key" in st.session_state and st.session_state.get("chain_dataset_key") != dataset_key
+
+    if ticker and (fetch_clicked or window_changed):
+        with st.spinner("Fetching options data..."):
+            try:
+                with span("home.load_chain"):
+                    dataset, store_key = engine.load_dataset(ticker, first_exp, last_exp, expected_aarr_method)
+                st.session_state["chain_store_key"] = store_key
+                st.session_state["chain_dataset_key"] = dataset_key
+                st.session_state["ticker"] = ticker
+                st.session_state["stock_price"] = market_price
+                st.session_state["volatility"] = volatility
+
+                # Start the new results on the first page
+                st.session_state["results_page"] = 1
+                st.session_state.pop("results_page_input", None)
+
+                st.success(f"✅ Fetched {len(dataset)} covered calls")
+
+            except Exception as e:
+                st.session_state.pop("chain_store_key", None)
+                st.session_state.pop("chain_dataset_key", None)
+                st.error(f"❌ Error fetching options: {e}")
+
+    # Apply filters and sort to the cached dataset (rebuilt if the store evicted it under memory pressure)
+    chain = None
+    if st.session_state.get("chain_dataset_key") == dataset_key and "chain_store_key" in st.session_state:
+        dataset = get_shared_store().get(st.session_state["chain_store_key"])
+        if dataset is None:
+            with span("home.load_chain"):
+                dataset, st.session_state["chain_store_key"] = engine.load_dataset(ticker, first_exp, last_exp, expected_aarr_method)
+        with span("home.filter_sort"):
+            chain = dataset.view(
+                sort_by,
+                call_types=call_type_filter,
+                min_strike=min_strike_price,
+                max_strike=max_strike_price,
+                min_premium=min_premium,
+                max_premium=max_premium,
+                min_aarr=min_aarr_filter,
+                max_aarr=max_aarr_filter
+            )
+
+    # Render results
+    if chain is not None:
+        with span("home.render"):
+            ticker = st.session_state["ticker"]
     
-    st.markdown("### Results")
+            st.divider()
     
-    # Results list
-    for idx, row in chain.iterrows():
-        strike = row["strike"]
-        premium = row["premium"]
-        exp = row["expiration"].date()
-        max_aarr = row["max_aarr"]
-        expected_aarr = row.get("expected_aarr", -9999) # NOTE this is the -9999 expected AARR fallback
-        days = row["days_to_expiration"]
-        call_type = row["call_type"]
-        safety_score = row.get("safety_score", 0)
-        
-        # Badge color based on call type
-        if call_type == "🔴 Deep ITM":
-            badge_color = "#ff4444"
-        elif call_type == "🟠 ITM":
-            badge_color = "#ff8800"
-        elif call_type == "🟡 ATM":
-            badge_color = "#ffbb00"
-        elif call_type == "🟢 OTM":
-            badge_color = "#44ff44"
-        else:  # Deep OTM
-            badge_color = "#00ff88"
-        
-        with st.container():
-            st.markdown(f"""
-                <div style="
-                    border: 1px solid rgba(255, 255, 255, 0.15);
-                    border-radius: 12px;
-                    padding: 16px 24px;
-                    margin-bottom: 12px;
-                    background: linear-gradient(135deg, rgba(255, 255, 255, 0.02), rgba(255, 255, 255, 0.01));
-                ">
-            """, unsafe_allow_html=True)
-            
-            cols = st.columns([1, 3, 2, 2, 2, 3, 1.5])
-            with cols[0]:
-                st.markdown(f"<span style='color: {badge_color}; font-weight: bold;'>{call_type}</span>", unsafe_allow_html=True)
-            with cols[1]:
-                st.markdown(f"**Strike:** ${strike:.2f}")
-            with cols[2]:
-                st.markdown(f"**Premium:** ${premium:.2f}")
-            with cols[3]:
-                st.markdown(f"**Days:** {days}")
-            with cols[4]:
-                st.markdown(f"**Expires:** {exp}")
-            with cols[5]:
-                # Use expected AARR for the color, gives a more reliable AARR.
-                max_aarr_color = "#44ff44" if max_aarr >= 20 else "#ffbb00" if max_aarr >= 10 else "#A0A0A0"
-                expected_aarr_color = "#44ff44" if expected_aarr >= 20 else "#ffbb00" if expected_aarr >= 10 else "#A0A0A0"
-                
-                # Color code safety: green (8-10), yellow (5-7), red (0-4)
-                if safety_score >= 8:
-                    safety_color = "#44ff44"
-                    safety_emoji = "🟢"
-                elif safety_score >= 5:
-                    safety_color = "#ffbb00"
-                    safety_emoji = "🟡"
+            # Summary stats
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Results", len(chain))
+            with col2:
+                # st.metric("Avg AARR", f"{chain['aarr'].mean():.1f}%")
+                if 'expected_aarr' in chain.columns:
+                    st.metric("Avg Expected AARR", f"{chain['expected_aarr'].mean():.1f}%")
                 else:
-                    safety_color = "#ff4444"
-                    safety_emoji = "🔴"
-                
-                st.markdown(f"<span style='font-weight: bold;'> Max/Expected AARR: </span><span style='color: {max_aarr_color}; font-weight: bold;'>{max_aarr:.1f}%</span>/<span style='color: {expected_aarr_color}; font-weight: bold;'>{expected_aarr:.1f}%</span><br>"
-                            f"<span style='font-weight: bold;'> Safety: </span><span style='color: {safety_color}; font-size: 0.9em;'>{safety_emoji}{safety_score:.1f}/10</span>", 
-                            unsafe_allow_html=True)
-            with cols[6]:
-                if st.button("View 📊", key=f"btn_{idx}", use_container_width=True):
-                    st.session_state["selected_call"] = row.to_dict()
-                    st.switch_page(AARR_PAGE)
-            
-            st.markdown("</div>", unsafe_allow_html=True)
\ No newline at end of file
+                    st.metric("Avg Max AARR", f"{chain['max_aarr'].mean():.1f}%")
+            with col3:
+                st.metric("Avg Premium", f"${chain['premium'].mean():.2f}")
+            with col4:
+                st.metric("Avg Days", f"{chain['days_to_expiration'].mean():.0f}")
+    
+            st.divider()
+    
+            # Export button. Serializing is O(chain), so the CSV is only built on request and kept for the
+            # current dataset version, filters and sort (page flips don't touch it)
+            export_key = (st.session_state["chain_store_key"], sort_by, tuple(call_type_filter), min_strike_price,
+                          max_strike_price, min_premium, max_premium, min_aarr_filter, max_aarr_filter)
+            if st.session_state.get("csv_export_key") != export_key:
+                st.session_state.pop("csv_export", None)
+                if st.button("📥 Prepare CSV Export"):
+                    with span("home.export_csv"):
+                        st.session_state["csv_export"] = chain.to_csv(index=False)
+                    st.session_state["csv_export_key"] = export_key
+            if "csv_export" in st.session_state:
+                st.download_button(
+                    label="📥 Download Results as CSV",
+                    data=st.session_state["csv_export"],
+                    file_name=f"{ticker}_covered_calls.csv",
+                    mime="text/csv",
+                )
+    
+            st.markdown("### Results")
+            store_stats = get_shared_store().stats()
+            st.caption(f"In memory: {bytes_per_contract(dataset):.0f} bytes per contract "
+                       f"({store_stats['entries']} chains, {store_stats['bytes'] / 1024**2:.1f} of "
+                       f"{store_stats['max_bytes'] / 1024**2:.0f} MB)")
+
+            # Pagination: only the current page is formatted and sent to the browser
+            col_size, col_page, col_info = st.columns([1, 1, 2])
+            with col_size:
+                page_size = st.selectbox("Rows per page", PAGE_SIZES,
+                                         index=PAGE_SIZES.index(st.session_state.get("page_size", 50)),
+                                         key="page_size_input",
+                                         on_change=lambda: st.session_state.update({"page_size": st.session_state["page_size_input"],
+                                                                                    "results_page": 1}))
+            num_pages = max(1, math.ceil(len(chain) / page_size))
+            # Filters can shrink the results below the current page
+            if st.session_state.get("results_page_input", 1) > num_pages:
+                st.session_state.pop("results_page_input")
+                st.session_state["results_page"] = num_pages
+            with col_page:
+                page = st.number_input("Page", min_value=1, max_value=num_pages,
+                                       value=min(st.session_state.get("results_page", 1), num_pages),
+                                       key="results_page_input",
+                                       on_change=lambda: st.session_state.update({"results_page": st.session_state["results_page_input"]}))
+            with col_info:
+                first_row = (page - 1) * page_size
+                st.caption(f"Showing {first_row + 1 if len(chain) else 0}-{min(first_row + page_size, len(chain))} of {len(chain)} calls. "
+                           "Select a row to view its AARR chart.")
+
+            page_chain = chain.iloc[first_row:first_row + page_size]
+            event = st.dataframe(
+                style_results_page(page_chain),
+                hide_index=True,
+                use_container_width=True,
+                on_select="rerun",
+                selection_mode="single-row",
+                # New key after each navigation so the selection doesn't survive coming back
+                key=f"results_table_{st.session_state.get('results_table_version', 0)}",
+            )
+
+            # Row selection routes to the AARR page
+            if event.selection.rows:
+                row = page_chain.iloc[event.selection.rows[0]]
+                st.session_state["selected_call"] = row.to_dict()
+                st.session_state["results_table_version"] = st.session_state.get("results_table_version", 0) + 1
+                st.switch_page(AARR_PAGE)
+
+# The trace ends however the run exits (page switch, rerun, stop or error)
+with instrumentation.trace(memory=debug_memory) if debug_panel else nullcontext() as trace:
+    main()
+
+# Debug panel (after rendering, so the render stage is included)
+if trace is not None:
+    with st.expander("🛠 Debug: stage timings", expanded=False):
+        st.caption(f"Request {trace.request_id}: {trace.seconds * 1000:.0f} ms script run"
+                   + (", memory peaks traced" if trace.memory else ""))
+        spans = pd.DataFrame(trace.span_rows())
+        if not spans.empty:
+            spans["ms"] = spans["seconds"] * 1000
+            spans["max ms"] = spans["max_seconds"] * 1000
+            st.dataframe(spans[["span", "calls", "ms", "max ms", "peak_mb"]], hide_index=True, use_container_width=True,
+                         column_config={"ms": st.column_config.NumberColumn(format="%.1f"),
+                                        "max ms": st.column_config.NumberColumn(format="%.1f"),
+                                        "peak_mb": st.column_config.NumberColumn("peak MB", format="%.1f")})
+        if trace.caches:
+            st.dataframe(pd.DataFrame.from_dict(trace.caches, orient="index").rename_axis("cache").reset_index(),
+                         hide_index=True)
+        st.download_button("📥 Export trace as JSON", data=trace.to_json(indent=2),
+                           file_name=f"trace_{trace.request_id}.json", mime="application/json")
@@ -0,0 +1,182 @@
+"""
+Asyncio market data layer: concurrent upstream requests for one ticker or many.
+
+AsyncMarketData issues history (spot), expirations and per-expiration option chain requests
+concurrently, at most `max_concurrency` in flight (per instance; every instance shares the pool). Providers are blocking (yfinance is synchronous),
+so every request runs on one long-lived, shared worker pool. The connections stay warm between
+fetches: YFinanceProvider sends every request through one pooled HTTP session. Requests run in a
+copy of the caller's context, so instrumentation spans land in the active trace.
+
+Everything goes through a MarketDataProvider (get_provider() by default), so the layer runs fully
+offline against ReplayProvider or any stub provider.
+
+The sync wrappers (run, call_concurrently, fetch_option_chains, fetch_ticker_data, fetch_many) serve
+the existing utils / options call sites. They also work when the calling thread already runs an
+event loop.
+"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from providers import get_provider
+
+# Requests in flight at once per AsyncMarketData, and worker threads shared by all of them
+MAX_CONCURRENT_REQUESTS = 16
+POOL_SIZE = 32
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Shared worker pool for blocking provider calls (created on first use, lives with the process)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="market-data")
+        return _pool
+
+
+class AsyncMarketData:
+    """Async view of a MarketDataProvider with bounded concurrency."""
+
+    def __init__(self, provider=None, max_concurrency=MAX_CONCURRENT_REQUESTS):
+        self._provider = provider
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    @property
+    def provider(self):
+        return self._provider or get_provider()
+
+    async def call(self, func, *args, timeout=None):
+        """
+        Run a blocking call on the shared pool, in a copy of the current context.
+
+        The timeout (seconds) is measured from when a worker starts the call: waiting for a slot of this
+        instance or for a free worker of the shared pool doesn't count. A running call can't be
+        interrupted, so one that times out keeps its worker, and its slot, until it returns.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        started = asyncio.Event()
+
+        def task():
+            loop.call_soon_threadsafe(started.set)
+            return context.run(func, *args)
+
+        await self._semaphore.acquire()
+        try:
+            future = loop.run_in_executor(_get_pool(), task)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        future.add_done_callback(lambda _: self._semaphore.release())
+        if timeout is None:
+            return await future
+
+        starting = asyncio.ensure_future(started.wait())
+        try:
+            await asyncio.wait({future, starting}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            starting.cancel()
+        # Shielded: on timeout the call keeps running, and holding its slot, in the background
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+    async def history(self, ticker, period="1d"):
+        return await self.call(self.provider.history, ticker, period)
+
+    async def expirations(self, ticker):
+        return tuple(await self.call(self.provider.expirations, ticker))
+
+    async def option_calls(self, ticker, expiration):
+        return await self.call(self.provider.option_calls, ticker, expiration)
+
+    async def spot(self, ticker):
+        """Last close (today's price during the session)."""
+        history = await self.history(ticker, "5d")
+        return float(history["Close"].iloc[-1])
+
+    async def option_chains(self, ticker, expirations, timeout=None, fetch=None):
+        """
+        Calls for every expiration, requested concurrently.
+
+        Arguments:
+        - timeout: seconds to wait for each expiration (None waits forever)
+        - fetch: blocking fetch(ticker, expiration) to use instead of provider.option_calls,
+          e.g. one that goes through the on-disk chain cache
+
+        Returns:
+        - {expiration: calls DataFrame, or the exception its request raised} in expiration order;
+          one failing or timed-out expiration doesn't affect the others
+        """
+        fetch = fetch or self.provider.option_calls
+
+        async def fetch_one(expiration):
+            try:
+                return await self.call(fetch, ticker, expiration, timeout=timeout)
+            except Exception as e:
+                return e
+
+        results = await asyncio.gather(*(fetch_one(expiration) for expiration in expirations))
+        return dict(zip(expirations, results))
+
+    async def ticker_data(self, ticker, period="1d", select_expiration=None, timeout=None):
+        """
+        History, spot, expirations and option chains of one ticker. History and expirations are
+        requested together, then the chains of every expiration for which select_expiration(expiration)
+        is true (none without select_expiration) all at once.
+        """
+        history, expirations = await asyncio.gather(self.history(ticker, period), self.expirations(ticker))
+        selected = [expiration for expiration in expirations if select_expiration and select_expiration(expiration)]
+        return {
+            "ticker": ticker.upper(),
+            "history": history,
+            "spot": float(history["Close"].iloc[-1]),
+            "expirations": expirations,
+            "chains": await self.option_chains(ticker, selected, timeout),
+        }
+
+    async def many(self, tickers, **kwargs):
+        """ticker_data for every ticker at once: {ticker: data, or the exception it raised}."""
+        results = await asyncio.gather(*(self.ticker_data(ticker, **kwargs) for ticker in tickers), return_exceptions=True)
+        return dict(zip(tickers, results))
+
+
+def run(coroutine):
+    """Run a coroutine to completion from sync code, even if this thread is already running an event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # Inside a running loop (notebook, async service): use a private loop on another thread
+    with ThreadPoolExecutor(max_workers=1) as runner:
+        return runner.submit(contextvars.copy_context().run, asyncio.run, coroutine).result()
+
+
+def call_concurrently(*funcs, max_concurrency=MAX_CONCURRENT_REQUESTS):
+    """Run blocking zero-argument callables concurrently; returns their results in order (first error raised)."""
+    async def gather():
+        data = AsyncMarketData(max_concurrency=max_concurrency)
+        return await asyncio.gather(*(data.call(func) for func in funcs))
+    return list(run(gather()))
+
+
+def fetch_option_chains(ticker, expirations, timeout=None, fetch=None, provider=None,
+                        max_concurrency=MAX_CONCURRENT_REQUESTS):
+    """Sync AsyncMarketData.option_chains."""
+    return run(AsyncMarketData(provider, max_concurrency).option_chains(ticker, expirations, timeout, fetch))
+
+
+def fetch_ticker_data(ticker, period="1d", select_expiration=None, timeout=None, provider=None,
+                      max_concurrency=MAX_CONCURRENT_REQUESTS):
+    """Sync AsyncMarketData.ticker_data."""
+    return run(AsyncMarketData(provider, max_concurrency).ticker_data(ticker, period, select_expiration, timeout))
+
+
+def fetch_many(tickers, period="1d", select_expiration=None, timeout=None, provider=None,
+               max_concurrency=MAX_CONCURRENT_REQUESTS):
+    """Sync AsyncMarketData.many."""
+    data = AsyncMarketData(provider, max_concurrency)
+    return run(data.many(tickers, period=period, select_expiration=select_expiration, timeout=timeout))
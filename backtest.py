@@ -0,0 +1,275 @@
+"""
+Covered call backtester over a ticker's daily price history.
+
+    python backtest.py AAPL --days 7:90:1 --moneyness 0.95:1.20:0.005 --output backtest.csv
+    python backtest.py AAPL --days 30 --moneyness 1.05 --cycles
+
+Rule: buy 100 shares and sell the ~N-day call at strike = spot x k. At expiry the shares are
+called away (final price >= strike) or kept. After the 3 settlement days the next cycle sells a
+new call, back to back through the whole history. Premiums are Black-Scholes prices with trailing
+historical volatility ("hv") or a given implied volatility (a constant, or a Series by date).
+
+Every cycle uses compute_aarr semantics (compute_aarr_batch, 3 settlement days included). The
+realized AARR of a rule compounds its cycles over the calendar time they took, and is compared with
+compute_hold_aarr over the same span. Each cycle's expected AARR (what the Home page would have
+shown for that call) is reported next to what it realized.
+
+The cycle schedule only depends on N, so the backtest loops over the day counts. Moneyness and
+cycles are vectorized: one (cycles x moneyness) array per day count, thousands of rules in seconds.
+AARR only depends on price ratios, so expected AARR is computed per unit of spot.
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+import utils
+from providers import get_provider
+
+# Price history downloaded for a ticker backtest
+BACKTEST_PERIOD = "10y"
+
+# Trailing window of the historical volatility premiums are priced with, in calendar days
+HV_WINDOW = 30
+
+# Calendar days between expiry and the next cycle (same as compute_aarr)
+SETTLEMENT_DAYS = 3
+
+SUMMARY_COLUMNS = ["days", "moneyness", "cycles", "assignment_rate", "realized_aarr", "hold_aarr", "excess_aarr",
+                   "mean_cycle_aarr", "mean_expected_aarr", "expected_realized_corr"]
+
+
+def schedule(dates, days, start=0):
+    """
+    (start, expiry) bar indices of back to back cycles from bar `start`: each expiry is the first bar
+    at least `days` calendar days after its start, the next start the first bar SETTLEMENT_DAYS after that.
+    """
+    dates = pd.DatetimeIndex(dates)
+    expiry_of = dates.searchsorted(dates + pd.Timedelta(days=days), side="left")
+    next_start = np.full(len(dates), len(dates))
+    complete = expiry_of < len(dates)
+    next_start[complete] = dates.searchsorted(dates[expiry_of[complete]] + pd.Timedelta(days=SETTLEMENT_DAYS))
+
+    starts = []
+    while start < len(dates) and complete[start]:
+        starts.append(start)
+        start = next_start[start]
+    starts = np.asarray(starts, dtype=int)
+    return starts, expiry_of[starts]
+
+
+def _dates(index):
+    """Naive calendar dates of a DatetimeIndex (yfinance histories are tz-aware, at midnight exchange time)."""
+    index = pd.DatetimeIndex(index)
+    return (index.tz_localize(None) if index.tz is not None else index).normalize()
+
+
+def _volatility_at(history, volatility, hv_window):
+    """Volatility premiums are priced with, for every bar."""
+    if isinstance(volatility, str):
+        if volatility != "hv":
+            raise ValueError(f"Unknown volatility source: {volatility} (expected 'hv', a number or a Series)")
+        hv = utils.trailing_historical_volatility(history, hv_window)
+        # Only once a full window of history is available
+        hv[history.index < history.index[0] + pd.Timedelta(days=hv_window)] = np.nan
+        return hv
+    if isinstance(volatility, pd.Series):
+        # Implied volatility by date: the latest value known at each bar
+        volatility = pd.Series(volatility.to_numpy(dtype=float), index=_dates(volatility.index)).sort_index()
+        return volatility.reindex(history.index, method="ffill").to_numpy(dtype=float)
+    return np.full(len(history), float(volatility))
+
+
+def _simulate_cycles(close, dates, volatility, days, moneyness, r, start, expected_aarr_method):
+    """(cycles x moneyness) arrays of every cycle of one day count (see schedule)."""
+    starts, expiries = schedule(dates, days, start)
+    spot = close[starts][:, None]
+    final = close[expiries][:, None]
+    cycle_days = np.asarray((dates[expiries] - dates[starts]).days, dtype=float)[:, None]
+    sigma = volatility[starts][:, None]
+    strike = spot * moneyness[None, :]
+    premium = utils.black_scholes_call_price(spot, strike, cycle_days / 365.0, r, sigma)
+
+    aarr, _, start_money, end_money = utils.compute_aarr_batch(100, spot, strike, premium, cycle_days,
+                                                               final_market_price=final)
+    cycles = {
+        "starts": starts,
+        "expiries": expiries,
+        "cycle_days": np.broadcast_to(cycle_days, aarr.shape),
+        "spot": np.broadcast_to(spot, aarr.shape),
+        "strike": strike,
+        "premium": premium,
+        "volatility": np.broadcast_to(sigma, aarr.shape),
+        "final": np.broadcast_to(final, aarr.shape),
+        "called_away": final >= strike,
+        "growth": end_money / start_money,
+        "aarr": aarr,
+    }
+    if expected_aarr_method:
+        # Scale-free: strikes and premiums per unit of spot
+        relative_premium = premium / spot
+        expected = utils.compute_expected_aarr_batch(
+            np.broadcast_to(moneyness[None, :], aarr.shape).ravel(), relative_premium.ravel(),
+            cycles["cycle_days"].ravel(), 1.0, cycles["volatility"].ravel(), method=expected_aarr_method,
+        )
+        cycles["expected_aarr"] = expected.reshape(aarr.shape)
+    return cycles
+
+
+def _first_start(volatility):
+    priced = np.flatnonzero(np.isfinite(volatility) & (volatility > 0))
+    if len(priced) == 0:
+        raise ValueError("No bar has a usable volatility to price premiums with")
+    return int(priced[0])
+
+
+def _prepare(history, volatility, hv_window):
+    history = history[["Close"]].dropna()
+    history.index = _dates(history.index)
+    bar_volatility = _volatility_at(history, volatility, hv_window)
+    return history["Close"].to_numpy(dtype=float), history.index, bar_volatility
+
+
+def backtest(history, days, moneyness, volatility="hv", r=0.04, hv_window=HV_WINDOW, expected_aarr_method="grid"):
+    """
+    Backtest every (days, moneyness) rule on one price history.
+
+    Arguments:
+    - history: daily prices with a Close column and a DatetimeIndex (e.g. provider.history(ticker, "10y"))
+    - days: calendar days to expiry of the call sold each cycle (int or list)
+    - moneyness: strike / spot of the call sold each cycle (float or list)
+    - volatility: "hv" (trailing HV over hv_window days at each cycle start), a constant implied
+      volatility, or a Series of implied volatility by date
+    - r: risk-free rate used in the Black-Scholes premiums
+    - expected_aarr_method: method of the expected AARR reported per cycle (see utils.compute_expected_aarr_batch),
+      None to skip it
+
+    Returns:
+    - DataFrame, one row per rule (SUMMARY_COLUMNS): cycles, share of cycles called away, realized
+      AARR (all cycles compounded over the calendar days they took), hold AARR (compute_hold_aarr over
+      the same span), their difference, mean per-cycle realized and expected AARR, and the correlation
+      between the two across cycles. Every rule starts on the same first bar with a usable volatility.
+    """
+    close, dates, bar_volatility = _prepare(history, volatility, hv_window)
+    start = _first_start(bar_volatility)
+    moneyness = np.atleast_1d(np.asarray(moneyness, dtype=float))
+
+    summaries = []
+    for n in sorted(set(np.atleast_1d(days).astype(int).tolist())):
+        cycles = _simulate_cycles(close, dates, bar_volatility, n, moneyness, r, start, expected_aarr_method)
+        count = len(cycles["starts"])
+        summary = pd.DataFrame({"days": n, "moneyness": moneyness, "cycles": count})
+        if count == 0:
+            summaries.append(summary.reindex(columns=SUMMARY_COLUMNS))
+            continue
+
+        # Calendar span from the first sale to the settlement of the last expiry
+        elapsed = (dates[cycles["expiries"][-1]] - dates[start]).days + SETTLEMENT_DAYS
+        with np.errstate(over="ignore"):
+            total_growth = np.exp(np.log(cycles["growth"]).sum(axis=0))
+            summary["realized_aarr"] = (total_growth ** (365 / elapsed) - 1) * 100
+        summary["hold_aarr"], _ = utils.compute_hold_aarr(100, close[start], close[cycles["expiries"][-1]], elapsed)
+        summary["excess_aarr"] = summary["realized_aarr"] - summary["hold_aarr"]
+        summary["assignment_rate"] = cycles["called_away"].mean(axis=0)
+        summary["mean_cycle_aarr"] = cycles["aarr"].mean(axis=0)
+        if expected_aarr_method:
+            summary["mean_expected_aarr"] = cycles["expected_aarr"].mean(axis=0)
+            summary["expected_realized_corr"] = _column_correlation(cycles["expected_aarr"], cycles["aarr"])
+        summaries.append(summary.reindex(columns=SUMMARY_COLUMNS))
+
+    return pd.concat(summaries, ignore_index=True)
+
+
+def _column_correlation(x, y):
+    """Pearson correlation of every column pair (NaN where a column is constant or has < 2 rows)."""
+    x = x - x.mean(axis=0)
+    y = y - y.mean(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (x * y).sum(axis=0) / np.sqrt((x**2).sum(axis=0) * (y**2).sum(axis=0))
+
+
+def backtest_cycles(history, days, moneyness, volatility="hv", r=0.04, hv_window=HV_WINDOW, expected_aarr_method="grid"):
+    """Every cycle of one rule (same simulation as backtest): dates, prices, premium, outcome and AARR."""
+    close, dates, bar_volatility = _prepare(history, volatility, hv_window)
+    cycles = _simulate_cycles(close, dates, bar_volatility, int(days), np.array([float(moneyness)]), r,
+                              _first_start(bar_volatility), expected_aarr_method)
+    table = pd.DataFrame({
+        "start": dates[cycles["starts"]],
+        "expiration": dates[cycles["expiries"]],
+        "days": cycles["cycle_days"][:, 0].astype(int),
+        "spot": cycles["spot"][:, 0],
+        "strike": cycles["strike"][:, 0],
+        "premium": cycles["premium"][:, 0],
+        "volatility": cycles["volatility"][:, 0],
+        "final_price": cycles["final"][:, 0],
+        "called_away": cycles["called_away"][:, 0],
+        "aarr": cycles["aarr"][:, 0],
+    })
+    if expected_aarr_method:
+        table["expected_aarr"] = cycles["expected_aarr"][:, 0]
+    table["hold_aarr"], _ = utils.compute_hold_aarr(100, table["spot"], table["final_price"],
+                                                    table["days"] + SETTLEMENT_DAYS)
+    return table
+
+
+def backtest_ticker(ticker, days, moneyness, period=BACKTEST_PERIOD, volatility="hv", r=None, **kwargs):
+    """backtest() on the ticker's daily history from the market data provider (r: current risk-free rate if None)."""
+    history = get_provider().history(ticker, period=period)
+    r = utils.get_risk_free_rate() if r is None else r
+    return backtest(history, days, moneyness, volatility=volatility, r=r, **kwargs)
+
+
+def parse_values(tokens, kind=float):
+    """Command line values: numbers, or start:stop:step ranges (stop included)."""
+    values = []
+    for token in tokens:
+        if ":" in token:
+            start, stop, step = (float(part) for part in token.split(":"))
+            values.extend(np.round(np.arange(start, stop + step / 2, step), 10).tolist())
+        else:
+            values.append(float(token))
+    return [kind(value) for value in values]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest covered call rules on a ticker's price history.")
+    parser.add_argument("ticker")
+    parser.add_argument("--days", nargs="+", default=["30"], help="days to expiry: values or start:stop:step")
+    parser.add_argument("--moneyness", nargs="+", default=["1.05"], help="strike / spot: values or start:stop:step")
+    parser.add_argument("--period", default=BACKTEST_PERIOD, help="price history to backtest on (yfinance period)")
+    parser.add_argument("--iv", type=float, help="constant implied volatility for premiums (default: trailing HV)")
+    parser.add_argument("--hv-window", type=int, default=HV_WINDOW, help="trailing HV window in calendar days")
+    parser.add_argument("--rate", type=float, help="risk-free rate (default: current 3-month T-bill)")
+    parser.add_argument("--expected-aarr", default="grid", choices=["grid", "exact", "none"],
+                        help="expected AARR method reported per cycle (none is fastest)")
+    parser.add_argument("--cycles", action="store_true", help="print every cycle of the first rule instead")
+    parser.add_argument("--output", "-o", help="write the results to this CSV file")
+    parser.add_argument("--top", type=int, default=20, help="rows printed when there's no --output")
+    args = parser.parse_args(argv)
+
+    days = parse_values(args.days, int)
+    moneyness = parse_values(args.moneyness)
+    history = get_provider().history(args.ticker, period=args.period)
+    r = utils.get_risk_free_rate() if args.rate is None else args.rate
+    volatility = "hv" if args.iv is None else args.iv
+    expected_aarr_method = None if args.expected_aarr == "none" else args.expected_aarr
+
+    if args.cycles:
+        results = backtest_cycles(history, days[0], moneyness[0], volatility, r, args.hv_window, expected_aarr_method)
+    else:
+        results = backtest(history, days, moneyness, volatility, r, args.hv_window, expected_aarr_method)
+        results = results.sort_values("realized_aarr", ascending=False, ignore_index=True)
+        print(f"{len(results)} rules on {len(history)} days of {args.ticker.upper()}", file=sys.stderr)
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"Wrote {len(results)} rows to {args.output}", file=sys.stderr)
+    else:
+        print(results.head(args.top).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""
+Benchmarks for the analytics hot paths over synthetic option chains.
+
+Every benchmark runs at each chain size (100 to 1,000,000 contracts by default) and records the best
+wall time of a few runs, the throughput in contracts per second and the peak traced memory of one
+extra run (tracemalloc). No network is used: market data comes from SyntheticProvider and the
+on-disk chain cache is turned off.
+
+Results go to a tab-separated file tagged with the current git commit. Keep the file from one commit
+and pass it to --compare on the next run to see the regressions:
+
+    python benchmark.py --output before.txt
+    git checkout my-branch
+    python benchmark.py --compare before.txt
+
+Scalar (per-contract Python) functions are only run up to --scalar-limit contracts. Their batch
+counterparts, which the app actually uses, run at every size.
+"""
+
+import argparse
+import csv
+import math
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import chain_cache
+import chain_refresh
+import monte_carlo
+import options
+import providers
+import utils
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_OUTPUT = "bench_output.txt"
+SCALAR_LIMIT = 10_000
+REPEAT = 3
+REGRESSION_THRESHOLD = 1.2  # slowdown ratio flagged by --compare
+
+SPOT = 100.0
+VOLATILITY = 0.3
+RISK_FREE_RATE = 0.04
+MAX_EXPIRATIONS = 52
+FIELDS = ["commit", "benchmark", "contracts", "seconds", "contracts_per_second", "peak_mb"]
+
+
+def synthetic_chain(n, seed=0):
+    """
+    n call contracts spread over weekly expirations, strikes from 50% to 150% of SPOT and
+    Black-Scholes premiums with some noise, in the same columns yfinance returns.
+    """
+    rng = np.random.default_rng(seed)
+    num_expirations = min(MAX_EXPIRATIONS, max(1, n // 50))
+    days = 7 * (1 + np.arange(n) % num_expirations)
+    strikes = np.round(SPOT * rng.uniform(0.5, 1.5, n), 1)
+    fair = utils.black_scholes_call_price(SPOT, strikes, days / 365.0, RISK_FREE_RATE, VOLATILITY)
+    last = np.round(np.maximum(fair * rng.normal(1.0, 0.05, n), 0.01), 2)
+    return pd.DataFrame({
+        "strike": strikes,
+        "lastPrice": last,
+        "bid": np.round(last * 0.98, 2),
+        "ask": np.round(last * 1.02, 2),
+        "impliedVolatility": VOLATILITY,
+        "expiration": pd.Series(days).map({d: str(date.today() + timedelta(days=int(d))) for d in np.unique(days)}),
+    })
+
+
+class SyntheticProvider(providers.MarketDataProvider):
+    """Offline market data: one synthetic chain per ticker, served one expiration at a time."""
+
+    def __init__(self):
+        self.chains = {}
+
+    def add(self, ticker, chain):
+        self.chains[ticker] = {exp: calls.drop(columns="expiration").reset_index(drop=True)
+                               for exp, calls in chain.groupby("expiration")}
+
+    def history(self, ticker, period="1d"):
+        if ticker == "^IRX":
+            return pd.DataFrame({"Close": [RISK_FREE_RATE * 100]}, index=pd.date_range(end=date.today(), periods=1))
+        index = pd.bdate_range(end=date.today(), periods=500)
+        returns = np.random.default_rng(1).normal(0, VOLATILITY / math.sqrt(252), len(index))
+        return pd.DataFrame({"Close": SPOT * np.exp(np.cumsum(returns - returns.sum() / len(index)))}, index=index)
+
+    def expirations(self, ticker):
+        return tuple(sorted(self.chains[ticker]))
+
+    def option_calls(self, ticker, expiration):
+        return self.chains[ticker][expiration].copy()
+
+    def info(self, ticker):
+        return {"currentPrice": SPOT}
+
+
+def measure(func, repeat=REPEAT):
+    """(best wall time in seconds, peak traced memory in MB) of func()."""
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 1024**2
+
+
+def benchmarks(n, chain, scalar_limit):
+    """(name, callable) pairs to time for a chain of n contracts."""
+    strikes = chain["strike"].to_numpy()
+    premiums = chain["lastPrice"].to_numpy()
+    days = (pd.to_datetime(chain["expiration"]) - pd.Timestamp(date.today())).dt.days.to_numpy()
+    volatility = np.full(n, VOLATILITY)
+    ticker = f"SYN{n}"
+
+    def aarr_scalar():
+        for k, p, d in zip(strikes, premiums, days):
+            utils.compute_aarr(100, SPOT, k, p, d, final_market_price=k)
+
+    def aarr_batch():
+        utils.compute_aarr_batch(100, SPOT, strikes, premiums, days, final_market_price=strikes)
+
+    def expected_aarr_scalar():
+        for k, p, d in zip(strikes, premiums, days):
+            utils.compute_expected_aarr_for_call(k, p, d, SPOT, VOLATILITY)
+
+    def expected_aarr_batch():
+        utils.compute_expected_aarr_batch(strikes, premiums, days, SPOT, volatility)
+
+    def price_probabilities():
+        # One price grid per contract, in the same row chunks as the expected AARR batch
+        grid = np.linspace(*utils.EXPECTED_AARR_GRID_RANGE, utils.EXPECTED_AARR_GRID_POINTS) * SPOT
+        for start in range(0, n, utils.EXPECTED_AARR_CHUNK_SIZE):
+            rows = slice(start, start + utils.EXPECTED_AARR_CHUNK_SIZE)
+            utils.calculate_price_probabilities(SPOT, grid, days[rows], volatility[rows])
+
+    def safety_scalar():
+        raw = np.array([utils.calculate_safety_score(k, p, SPOT, d, VOLATILITY)
+                        for k, p, d in zip(strikes, premiums, days)])
+        for score in raw:
+            utils.normalize_safety_score(score, raw)
+
+    def safety_batch():
+        greeks = utils.compute_greeks(strikes, premiums, SPOT, days, volatility, r=RISK_FREE_RATE)
+        utils.normalize_safety_scores(greeks["safety_score_raw"].to_numpy())
+
+    def monte_carlo_gbm():
+        # Paths are simulated once per horizon and cached, so this times the per-contract evaluation
+        monte_carlo.aarr_distribution(strikes, premiums, days, SPOT, volatility, model="gbm")
+
+    def fetch_enrichment():
+        chain_refresh.clear()
+        options.fetch_options_chain(ticker, first_expiration=0, last_expiration=365)
+
+    fetched = {}
+
+    def home_enrichment():
+        # Enrichment Home.py applies after the fetch (the fetch itself is timed above)
+        if "chain" not in fetched:
+            fetched["chain"] = options.fetch_options_chain(ticker, first_expiration=0, last_expiration=365)
+        enriched = options.add_call_types(fetched["chain"], SPOT)
+        options.add_safety_scores(enriched, SPOT, VOLATILITY, r=RISK_FREE_RATE)
+
+    scalar = n <= scalar_limit
+    return [
+        ("compute_aarr", aarr_scalar if scalar else None),
+        ("compute_aarr_batch", aarr_batch),
+        ("compute_expected_aarr_for_call", expected_aarr_scalar if scalar else None),
+        ("compute_expected_aarr_batch", expected_aarr_batch),
+        ("calculate_price_probabilities", price_probabilities),
+        ("calculate_safety_score+normalize", safety_scalar if scalar else None),
+        ("compute_greeks+normalize_safety_scores", safety_batch),
+        # contracts x paths: as slow as the scalar functions on big chains, so bounded by the same limit
+        ("monte_carlo.aarr_distribution(gbm)", monte_carlo_gbm if scalar else None),
+        ("fetch_options_chain", fetch_enrichment),
+        ("add_call_types+add_safety_scores", home_enrichment),
+    ]
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(sizes=DEFAULT_SIZES, scalar_limit=SCALAR_LIMIT, repeat=REPEAT, only=None):
+    """Run every benchmark at every size; returns a list of result rows (dicts with FIELDS)."""
+    # No network and no on-disk cache: everything comes from the synthetic provider
+    provider = SyntheticProvider()
+    providers.set_provider(provider)
+    chain_cache.CACHE_ENABLED = False
+
+    commit = current_commit()
+    results = []
+    for n in sizes:
+        chain = synthetic_chain(n)
+        provider.add(f"SYN{n}", chain)
+        for name, func in benchmarks(n, chain, scalar_limit):
+            if func is None or (only and not any(pattern in name for pattern in only)):
+                continue
+            seconds, peak_mb = measure(func, repeat)
+            row = {
+                "commit": commit,
+                "benchmark": name,
+                "contracts": n,
+                "seconds": f"{seconds:.6f}",
+                "contracts_per_second": f"{n / seconds:.1f}" if seconds > 0 else "inf",
+                "peak_mb": f"{peak_mb:.2f}",
+            }
+            results.append(row)
+            print(f"{name:<40} {n:>9,} contracts  {seconds * 1000:>10.2f} ms  "
+                  f"{n / seconds:>14,.0f}/s  peak {peak_mb:>8.1f} MB", flush=True)
+    return results
+
+
+def write_results(results, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, delimiter="\t")
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def read_results(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f, delimiter="\t"))
+
+
+def compare(baseline, results, threshold=REGRESSION_THRESHOLD):
+    """Print time and memory ratios against a baseline run; returns the number of regressions."""
+    before = {(row["benchmark"], int(row["contracts"])): row for row in baseline}
+    regressions = 0
+    print(f"\nCompared with {baseline[0]['commit'] if baseline else '?'} (ratio > 1 means slower / more memory):")
+    for row in results:
+        old = before.get((row["benchmark"], int(row["contracts"])))
+        if old is None:
+            continue
+        time_ratio = float(row["seconds"]) / max(float(old["seconds"]), 1e-9)
+        memory_ratio = float(row["peak_mb"]) / max(float(old["peak_mb"]), 1e-6)
+        flag = ""
+        if time_ratio > threshold:
+            flag = "  <-- REGRESSION"
+            regressions += 1
+        print(f"{row['benchmark']:<40} {int(row['contracts']):>9,}  time x{time_ratio:5.2f}  memory x{memory_ratio:5.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analytics hot paths on synthetic option chains.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="chain sizes in contracts")
+    parser.add_argument("--scalar-limit", type=int, default=SCALAR_LIMIT,
+                        help="largest chain the per-contract scalar functions are run on")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="timed runs per benchmark (best is kept)")
+    parser.add_argument("--only", nargs="+", help="run only benchmarks whose name contains one of these")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="results file (tab-separated)")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.scalar_limit, args.repeat, args.only)
+    write_results(results, args.output)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        regressions = compare(read_results(args.compare), results, args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
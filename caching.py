@@ -0,0 +1,73 @@
+"""
+In-process memoization with a time-to-live, for the Streamlit-free library modules.
+
+    @ttl_cache(ttl=300)
+    def get_market_snapshot(ticker): ...
+
+Works like st.cache_data without the Streamlit runtime: results are keyed by the bound call arguments
+(which must be hashable), expire after `ttl` seconds and the least recently used entries are dropped
+beyond `max_entries`. `copy=True` hands every caller its own copy of the result (as st.cache_data
+does), for results that callers modify in place, like DataFrames. Hits and misses are reported to
+the active instrumentation trace under the function's name.
+"""
+
+import copy as copy_module
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+from instrumentation import record_cache
+
+DEFAULT_MAX_ENTRIES = 256
+
+
+def _copy(value):
+    if hasattr(value, "copy") and hasattr(value, "columns"):  # DataFrame: much cheaper than deepcopy
+        return value.copy()
+    return copy_module.deepcopy(value)
+
+
+def ttl_cache(ttl=None, max_entries=DEFAULT_MAX_ENTRIES, copy=False):
+    """
+    Decorator memoizing a function per argument set for `ttl` seconds (forever if None).
+    The wrapped function gets a .clear() method, like st.cache_data functions.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        entries = OrderedDict()  # key -> (expires_at, value)
+        lock = threading.Lock()
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = tuple(bound.arguments.items())
+
+            now = time.monotonic()
+            with lock:
+                entry = entries.get(key)
+                if entry is not None and entry[0] > now:
+                    entries.move_to_end(key)
+                    value = entry[1]
+                else:
+                    entry = None
+            record_cache(name, hit=entry is not None)
+            if entry is None:
+                value = func(*args, **kwargs)
+                with lock:
+                    entries[key] = (now + ttl if ttl is not None else float("inf"), value)
+                    entries.move_to_end(key)
+                    while len(entries) > max_entries:
+                        entries.popitem(last=False)
+            return _copy(value) if copy else value
+
+        def clear():
+            with lock:
+                entries.clear()
+
+        wrapper.clear = clear
+        return wrapper
+    return decorator
@@ -0,0 +1,117 @@
+"""
+Persistent option chain cache shared by every process on the machine.
+
+Each fetched expiration is stored in SQLite, keyed by (ticker, expiration, fetched_at). Several
+Streamlit workers or batch jobs can read and write the same file at the same time (WAL mode plus a
+busy timeout). Freshness follows market hours: during the regular session a snapshot is good for
+OPEN_TTL seconds. Anything fetched after the close or on a weekend stays good until the next open,
+so those quotes aren't refetched every five minutes.
+
+NOTE: exchange holidays are not modelled, they're treated like regular weekdays.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta
+from zoneinfo import ZoneInfo
+
+CACHE_PATH = os.environ.get("CHAIN_CACHE_PATH", os.path.join(".cache", "option_chains.sqlite3"))
+CACHE_ENABLED = os.environ.get("CHAIN_CACHE_ENABLED", "1") != "0"
+
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = dt_time(9, 30)
+MARKET_CLOSE = dt_time(16, 0)
+OPEN_TTL = 300  # seconds, while the market is open
+
+# Snapshots older than this are deleted when new data is written
+RETENTION_DAYS = 7
+
+_local = threading.local()
+
+
+def _connect():
+    """One connection per thread (sqlite3 connections can't be shared across threads)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != CACHE_PATH:
+        os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS option_chains (
+                ticker TEXT NOT NULL,
+                expiration TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (ticker, expiration, fetched_at)
+            )
+        """)
+        conn.commit()
+        _local.conn, _local.path = conn, CACHE_PATH
+    return conn
+
+
+def is_market_open(when):
+    """True if the regular US equity session is open at this datetime."""
+    when = when.astimezone(MARKET_TZ)
+    return when.weekday() < 5 and MARKET_OPEN <= when.time() < MARKET_CLOSE
+
+
+def next_market_open(when):
+    """Datetime of the next regular session open strictly after `when`."""
+    when = when.astimezone(MARKET_TZ)
+    day = when.date()
+    if when.time() >= MARKET_OPEN:
+        day += timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return datetime.combine(day, MARKET_OPEN, tzinfo=MARKET_TZ)
+
+
+def expires_at(fetched_at, ttl=OPEN_TTL):
+    """Unix time at which a snapshot fetched at `fetched_at` (unix time) goes stale, `ttl` seconds during the session."""
+    fetched = datetime.fromtimestamp(fetched_at, MARKET_TZ)
+    if is_market_open(fetched):
+        return fetched_at + ttl
+    return next_market_open(fetched).timestamp()
+
+
+def latest(ticker, expiration, now=None, ttl=OPEN_TTL):
+    """(fetched_at, calls) of the latest fresh snapshot for (ticker, expiration), or None."""
+    if not CACHE_ENABLED:
+        return None
+    now = time.time() if now is None else now
+    row = _connect().execute(
+        "SELECT fetched_at, data FROM option_chains WHERE ticker = ? AND expiration = ? "
+        "ORDER BY fetched_at DESC LIMIT 1",
+        (ticker.upper(), expiration),
+    ).fetchone()
+    if row is None or expires_at(row[0], ttl) <= now:
+        return None
+    return row[0], pickle.loads(row[1])
+
+
+def get(ticker, expiration, now=None, ttl=OPEN_TTL):
+    """Latest fresh snapshot of calls for (ticker, expiration), or None."""
+    snapshot = latest(ticker, expiration, now, ttl)
+    return None if snapshot is None else snapshot[1]
+
+
+def put(ticker, expiration, calls, fetched_at=None):
+    """Store a freshly fetched snapshot of calls and drop snapshots past the retention window."""
+    if not CACHE_ENABLED:
+        return
+    fetched_at = time.time() if fetched_at is None else fetched_at
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO option_chains (ticker, expiration, fetched_at, data) VALUES (?, ?, ?, ?)",
+            (ticker.upper(), expiration, fetched_at, pickle.dumps(calls)),
+        )
+        conn.execute(
+            "DELETE FROM option_chains WHERE fetched_at < ?",
+            (fetched_at - RETENTION_DAYS * 86400,),
+        )
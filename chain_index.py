@@ -0,0 +1,114 @@
+"""
+Indexed, enriched option chain for instant filtering and sorting.
+
+The unfiltered chain is kept as-is and every filterable / sortable column gets a sorted index once.
+Range filters resolve with searchsorted on those indexes and every sort order is precomputed, so
+changing a filter or the sort only costs a few array operations, never a refetch or a DataFrame sort.
+Call types are held as small integer codes into options.CALL_TYPES (classified here from the strikes
+when the chain has no call_type column), so the call type filter is one table lookup and the whole
+filter is a single mask pass. Orders match options.sort_chain. Column values keep their (possibly
+compact, see chain_store.compact_chain) dtype, and filter bounds are cast to it before comparing.
+"""
+
+import numpy as np
+import pandas as pd
+
+import options
+
+# Columns that get a sorted index (when present in the chain)
+INDEXED_COLUMNS = ["strike", "premium", "max_aarr", "expected_aarr", "days_to_expiration", "safety_score"]
+
+
+class IndexedChain:
+    """
+    Enriched, unfiltered chain plus per-column sorted indexes.
+    market_price, thresholds: classify the strikes (options.call_type_codes) when the chain has no
+    call_type column; it's added as a Categorical over options.CALL_TYPES
+    """
+
+    def __init__(self, chain, market_price=None, thresholds=options.CALL_TYPE_THRESHOLDS):
+        self.chain = chain.reset_index(drop=True)
+
+        # Call type of every row as an index into CALL_TYPES (-1: unknown)
+        self._call_type_codes = None
+        if "call_type" in self.chain.columns:
+            call_types = pd.Categorical(self.chain["call_type"], categories=options.CALL_TYPES)
+            self._call_type_codes = call_types.codes.astype(np.int8)
+        elif market_price is not None:
+            self._call_type_codes = options.call_type_codes(self.chain["strike"], market_price, thresholds).astype(np.int8)
+            self.chain["call_type"] = pd.Categorical.from_codes(self._call_type_codes, categories=options.CALL_TYPES)
+
+        # Row positions in ascending column order (NaNs last), and the column values in that order
+        self._order = {}
+        self._sorted_values = {}
+        for column in INDEXED_COLUMNS:
+            if column in self.chain.columns:
+                values = self.chain[column].to_numpy()
+                order = np.argsort(values, kind="stable").astype(np.int32)
+                self._order[column] = order
+                self._sorted_values[column] = values[order]
+
+        # Precomputed row order for every sort option (stable, NaNs last, same as options.sort_chain)
+        self._sort_orders = {}
+        for sort_by, (column, ascending) in options.sort_columns(self.chain.columns).items():
+            if column not in self._order:
+                self._sort_orders[sort_by] = np.arange(len(self.chain), dtype=np.int32)
+            elif ascending:
+                self._sort_orders[sort_by] = self._order[column]
+            else:
+                descending = -self.chain[column].to_numpy(dtype=np.float64)
+                self._sort_orders[sort_by] = np.argsort(descending, kind="stable").astype(np.int32)
+
+    def __len__(self):
+        return len(self.chain)
+
+    @property
+    def nbytes(self):
+        """Memory held by the chain plus its indexes."""
+        arrays = [*self._order.values(), *self._sorted_values.values(), *self._sort_orders.values()]
+        if self._call_type_codes is not None:
+            arrays.append(self._call_type_codes)
+        return int(self.chain.memory_usage(index=True, deep=True).sum()) + sum(a.nbytes for a in arrays)
+
+    def range_mask(self, column, low=None, high=None):
+        """Boolean row mask for low <= column <= high (either bound optional), via the sorted index."""
+        sorted_values = self._sorted_values[column]
+        # Compare in the column's own dtype, so a float32 premium of 2.3 still matches a bound of 2.3
+        cast = sorted_values.dtype.type if sorted_values.dtype.kind == "f" else float
+        low = None if low is None else cast(low)
+        high = None if high is None else cast(high)
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side="left")
+        end = np.count_nonzero(~np.isnan(sorted_values)) if high is None else np.searchsorted(sorted_values, high, side="right")
+        mask = np.zeros(len(self.chain), dtype=bool)
+        mask[self._order[column][start:end]] = True
+        return mask
+
+    def filter_mask(self, call_types=None, min_strike=0, max_strike=0, min_premium=0, max_premium=0, min_aarr=0, max_aarr=0):
+        """
+        Row mask for the Home page filters. Zero/empty values mean no limit; the AARR range applies to
+        max_aarr. call_types: labels from options.CALL_TYPES.
+        """
+        mask = np.ones(len(self.chain), dtype=bool)
+        if call_types:
+            if self._call_type_codes is None:
+                raise ValueError("Filtering by call type needs a call_type column or a market price")
+            # Lookup table over the codes; the extra last slot is code -1 (unknown), never selected
+            wanted = np.zeros(len(options.CALL_TYPES) + 1, dtype=bool)
+            wanted[[options.CALL_TYPES.index(t) for t in call_types if t in options.CALL_TYPES]] = True
+            mask &= wanted[self._call_type_codes]
+        for column, low, high in [
+            ("strike", min_strike, max_strike),
+            ("premium", min_premium, max_premium),
+            ("max_aarr", min_aarr, max_aarr),
+        ]:
+            low = low if low > 0 else None
+            high = high if high > 0 else None
+            if low is not None or high is not None:
+                mask &= self.range_mask(column, low, high)
+        return mask
+
+    def view(self, sort_by="AARR (Highest)", **filters):
+        """Filtered and sorted rows as a new DataFrame (keyword filters as in filter_mask)."""
+        mask = self.filter_mask(**filters)
+        order = self._sort_orders[sort_by]
+        return self.chain.iloc[order[mask[order]]].reset_index(drop=True)
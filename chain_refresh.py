@@ -0,0 +1,333 @@
+"""
+Incremental option chain refresh: refetch only stale expirations, re-enrich only changed ones.
+
+A ChainBook holds one ticker's chain as per-expiration blocks. Every block keeps its own fetch time
+and a fingerprint of the quotes enrichment reads (pd.util.hash_pandas_object). On refresh:
+
+1. Only expirations that are missing or stale under the RefreshPolicy are requested (near-term
+   expirations go stale sooner than far-dated ones). A refetch with an unchanged fingerprint just
+   renews the block's fetch time.
+2. Implied volatilities and max AARR are recomputed only for blocks whose quotes, days to expiry,
+   spot or risk-free rate changed.
+3. The IV surface is rebuilt from the blocks' solved IVs (cheap, no solver), and expected AARR is
+   recomputed only for blocks whose quotes or per-contract volatility changed.
+4. The enriched blocks are merged in expiration order. The version of the merged chain is a
+   fingerprint of its blocks, so it changes exactly when the chain's content does.
+
+The merged chain has the same rows, columns and numbers as a full fetch and enrichment.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+import async_data
+import chain_cache
+import iv_surface
+import monte_carlo
+import utils
+from instrumentation import record_cache, span
+
+# Raw call columns kept per block and fingerprinted (everything the enrichment reads)
+QUOTE_COLUMNS = ["strike", "lastPrice", "bid", "ask"]
+
+# Number of tickers (x volatility source) whose books are kept in memory
+BOOK_CACHE_SIZE = 64
+
+# Merged chains kept per book (one per expiration window in use)
+MERGED_CACHE_SIZE = 4
+
+
+@dataclass(frozen=True)
+class RefreshPolicy:
+    """
+    How long a block stays fresh while the market is open, by days to expiration.
+    tiers: ((max days to expiration, seconds), ...) in increasing order of days; later expirations use `default`.
+    Outside the session a block stays fresh until the next open (see chain_cache.expires_at).
+    """
+    tiers: tuple = ((7, 60), (30, 300), (90, 900))
+    default: float = 1800
+
+    def ttl(self, days_to_expiration):
+        for max_days, seconds in self.tiers:
+            if days_to_expiration <= max_days:
+                return seconds
+        return self.default
+
+    def stale_at(self, fetched_at, days_to_expiration):
+        """Unix time at which a block fetched at `fetched_at` goes stale."""
+        return chain_cache.expires_at(fetched_at, self.ttl(days_to_expiration))
+
+
+DEFAULT_POLICY = RefreshPolicy()
+
+
+def fingerprint(*values):
+    """Content hash of DataFrames, arrays and plain values (hex string)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        if isinstance(value, pd.DataFrame):
+            value = pd.util.hash_pandas_object(value, index=False).to_numpy()
+        if isinstance(value, np.ndarray):
+            digest.update(np.ascontiguousarray(value).tobytes())
+        else:
+            digest.update(repr(value).encode())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+
+def days_to_expiration(expiration):
+    """Whole days from now until the expiration date."""
+    return (pd.to_datetime(expiration) - pd.Timestamp.now()).days
+
+
+@dataclass
+class ExpirationBlock:
+    """Calls of one expiration, with what was derived from them and the inputs it was derived from."""
+    expiration: str
+    fetched_at: float
+    calls: pd.DataFrame
+    fingerprint: str
+    days: int = None
+    # Quote stage: IVs and max AARR, valid for quote_key = (fingerprint, days, spot, rate)
+    quote_key: tuple = None
+    ivs: np.ndarray = None
+    max_aarr: np.ndarray = None
+    # Enrich stage, per expected AARR method: the block's rows of the merged chain and the key they're valid for
+    enrich_keys: dict = field(default_factory=dict)
+    enriched: dict = field(default_factory=dict, repr=False)
+
+
+def _fetch_block(provider, ticker, expiration, ttl):
+    """(fetched_at, calls) for one expiration, from the on-disk chain cache when it's fresher than `ttl`."""
+    cached = chain_cache.latest(ticker, expiration, ttl=ttl)
+    record_cache("chain_cache", hit=cached is not None)
+    if cached is not None:
+        return cached
+    with span("upstream.option_calls"):
+        calls = provider.option_calls(ticker, expiration)
+    fetched_at = time.time()
+    chain_cache.put(ticker, expiration, calls, fetched_at)
+    return fetched_at, calls
+
+
+class ChainBook:
+    """One ticker's chain as per-expiration blocks (see the module docstring)."""
+
+    def __init__(self, ticker, volatility_source="iv", policy=DEFAULT_POLICY):
+        self.ticker = ticker.upper()
+        self.volatility_source = volatility_source
+        self.policy = policy
+        self.blocks = {}
+        self._merged = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stale_expirations(self, expirations, now=None):
+        """Expirations that have no block yet or whose block is past its refresh time."""
+        now = time.time() if now is None else now
+        stale = []
+        for expiration in expirations:
+            block = self.blocks.get(expiration)
+            if block is None or self.policy.stale_at(block.fetched_at, days_to_expiration(expiration)) <= now:
+                stale.append(expiration)
+        return stale
+
+    def refresh(self, snapshot, expirations, provider, expected_aarr_method="grid",
+                max_concurrency=async_data.MAX_CONCURRENT_REQUESTS, timeout=None):
+        """
+        Bring the blocks of `expirations` up to date and merge them.
+
+        Arguments:
+        - snapshot: the ticker's utils.MarketSnapshot (spot and risk-free rate)
+        - expirations: expiration dates (strings) of the window, in order
+        - provider: MarketDataProvider the stale expirations are requested from
+        - expected_aarr_method: see options.fetch_options_chain (blocks are enriched once per method)
+        - max_concurrency, timeout: concurrent requests and seconds to wait for each one
+
+        Returns:
+        - (chain, version): a new DataFrame in fetch_options_chain's columns, and the merged content's fingerprint
+        """
+        with self._lock:
+            self._drop_expired()
+            self._fetch(expirations, provider, max_concurrency, timeout)
+            window = [self.blocks[expiration] for expiration in expirations if expiration in self.blocks]
+            if not window:
+                raise ValueError("Failed to retrieve any call data.")
+            for block in window:
+                block.days = days_to_expiration(block.expiration)
+
+            self._quote(window, snapshot)
+            self._enrich(window, snapshot, expected_aarr_method)
+
+            version = fingerprint(*(block.enrich_keys[expected_aarr_method] for block in window))
+            chain = self._merged.get(version)
+            if chain is None:
+                chain = pd.concat([block.enriched[expected_aarr_method] for block in window], ignore_index=True)
+                self._merged[version] = chain
+                while len(self._merged) > MERGED_CACHE_SIZE:
+                    self._merged.popitem(last=False)
+            self._merged.move_to_end(version)
+            return chain.copy(), version
+
+    def _drop_expired(self):
+        today = pd.Timestamp.now().normalize()
+        for expiration in [e for e in self.blocks if pd.to_datetime(e) < today]:
+            del self.blocks[expiration]
+
+    def _fetch(self, expirations, provider, max_concurrency, timeout):
+        """Request the stale expirations concurrently and replace the blocks whose quotes changed."""
+        stale = self.stale_expirations(expirations)
+        for expiration in expirations:
+            record_cache("chain_blocks", hit=expiration not in stale)
+        if not stale:
+            return
+
+        ttls = {expiration: self.policy.ttl(days_to_expiration(expiration)) for expiration in stale}
+        with span("fetch.upstream_chains"):
+            results = async_data.fetch_option_chains(
+                self.ticker, stale, timeout=timeout, provider=provider, max_concurrency=max_concurrency,
+                fetch=lambda ticker, expiration: _fetch_block(provider, ticker, expiration, ttls[expiration]),
+            )
+
+        for expiration, result in results.items():
+            block = self.blocks.get(expiration)
+            if isinstance(result, Exception):
+                error = f"timed out after {timeout}s" if isinstance(result, TimeoutError) else result
+                if block is None:
+                    print(f"Skipping {expiration} due to error: {error}")
+                else:
+                    print(f"Keeping the previous {expiration} quotes, refresh failed: {error}")
+                continue
+
+            fetched_at, calls = result
+            calls = calls[[column for column in QUOTE_COLUMNS if column in calls.columns]].reset_index(drop=True)
+            content = fingerprint(calls)
+            if block is not None and block.fingerprint == content:
+                block.fetched_at = max(block.fetched_at, fetched_at)
+            else:
+                self.blocks[expiration] = ExpirationBlock(expiration, fetched_at, calls, content)
+
+    def _quote(self, window, snapshot):
+        """Implied volatilities and max AARR of the blocks whose quotes or market inputs changed."""
+        spot, r = snapshot.spot, snapshot.risk_free_rate
+        changed = [block for block in window if block.quote_key != (block.fingerprint, block.days, spot, r)]
+        for block in window:
+            record_cache("block_quotes", hit=block not in changed)
+
+        for block in changed:
+            strikes = block.calls["strike"].to_numpy(dtype=float)
+            with span("fetch.max_aarr"):
+                # Assume expiry price is at strike (this is always where max AARR is)
+                block.max_aarr = utils.compute_aarr_batch(
+                    num_shares=100,
+                    initial_market_price=spot,
+                    strike_price=block.calls["strike"].to_numpy(),
+                    premium=block.calls["lastPrice"].to_numpy(),
+                    expiry=np.full(len(block.calls), block.days),
+                    final_market_price=block.calls["strike"].to_numpy(),
+                )[0]
+            if self.volatility_source == "iv":
+                with span("fetch.iv_surface"):
+                    block.ivs = iv_surface.implied_volatility(
+                        iv_surface.quote_prices(block.calls), spot, strikes, block.days / 365.0, r
+                    )
+            block.quote_key = (block.fingerprint, block.days, spot, r)
+
+    def _enrich(self, window, snapshot, expected_aarr_method):
+        """Per-contract volatility for the window, then expected AARR of the blocks whose inputs changed."""
+        # Volatility per distinct day count, all windows from one price history download
+        with span("fetch.historical_volatility"):
+            windows = tuple(sorted({int(block.days) for block in window}))
+            volatilities = utils.get_historical_volatilities(self.ticker, windows)
+
+        # Implied volatility for every contract, interpolated (or flat-extrapolated) from the window's
+        # surface, including contracts whose own IV couldn't be solved. HV only when the surface is empty
+        # (no solvable IV anywhere in the window). The surface is cached per snapshot and window quotes.
+        surface = None
+        if self.volatility_source == "iv":
+            with span("fetch.iv_surface"):
+                quotes = fingerprint(*(block.quote_key for block in window))
+                surface = iv_surface.get_cached_surface(snapshot, quotes)
+                record_cache("iv_surface", hit=surface is not None)
+                if surface is None:
+                    surface = iv_surface.IVSurface(
+                        snapshot.spot,
+                        np.concatenate([block.calls["strike"].to_numpy(dtype=float) for block in window]),
+                        np.concatenate([np.full(len(block.calls), float(block.days)) for block in window]),
+                        np.concatenate([block.ivs for block in window]),
+                    )
+                    iv_surface.cache_surface(snapshot, quotes, surface)
+
+        for block in window:
+            historical = volatilities.get(int(block.days))
+            volatility = np.full(len(block.calls), np.nan if historical is None else historical, dtype=float)
+            if surface is not None:
+                implied = surface.volatility(block.calls["strike"].to_numpy(), np.full(len(block.calls), block.days))
+                volatility = np.where(np.isnan(implied), volatility, implied)
+
+            key = fingerprint(block.quote_key, expected_aarr_method, volatility)
+            record_cache("block_enrichment", hit=key == block.enrich_keys.get(expected_aarr_method))
+            if key == block.enrich_keys.get(expected_aarr_method):
+                continue
+
+            # Add Expected AARR (probability-weighted), whole block in one broadcast; Monte Carlo methods
+            # also add the AARR percentiles and the probability of a loss (one path set for the block's horizon)
+            with span("fetch.expected_aarr"):
+                if expected_aarr_method in monte_carlo.MODELS:
+                    distribution = monte_carlo.aarr_distribution(
+                        strikes=block.calls["strike"].to_numpy(),
+                        premiums=block.calls["lastPrice"].to_numpy(),
+                        days_to_expiry=np.full(len(block.calls), block.days),
+                        market_price=snapshot.spot,
+                        volatility=volatility,
+                        model=expected_aarr_method,
+                        ticker=self.ticker,
+                        history=snapshot.history,
+                    )
+                else:
+                    distribution = pd.DataFrame({"expected_aarr": utils.compute_expected_aarr_batch(
+                        strikes=block.calls["strike"].to_numpy(),
+                        premiums=block.calls["lastPrice"].to_numpy(),
+                        days_to_expiry=np.full(len(block.calls), block.days),
+                        market_price=snapshot.spot,
+                        volatility=volatility,
+                        method=expected_aarr_method,
+                    )})
+            block.enriched[expected_aarr_method] = pd.DataFrame({
+                "strike": block.calls["strike"],
+                "premium": block.calls["lastPrice"],
+                "expiration": pd.Series(pd.to_datetime(block.expiration), index=block.calls.index),
+                "days_to_expiration": np.full(len(block.calls), block.days, dtype=np.int64),
+                "volatility": volatility,
+                "max_aarr": block.max_aarr,
+                **{column: distribution[column].to_numpy() for column in distribution.columns},
+            })
+            block.enrich_keys[expected_aarr_method] = key
+
+
+_books = OrderedDict()
+_books_lock = threading.Lock()
+
+
+def get_book(ticker, volatility_source="iv", policy=DEFAULT_POLICY):
+    """The process-wide ChainBook of a ticker (least recently used books are dropped past BOOK_CACHE_SIZE)."""
+    key = (ticker.upper(), volatility_source, policy)
+    with _books_lock:
+        book = _books.get(key)
+        if book is None:
+            book = _books[key] = ChainBook(ticker, volatility_source, policy)
+        _books.move_to_end(key)
+        while len(_books) > BOOK_CACHE_SIZE:
+            _books.popitem(last=False)
+        return book
+
+
+def clear():
+    """Forget every book (the next refresh refetches and re-enriches everything)."""
+    with _books_lock:
+        _books.clear()
@@ -0,0 +1,120 @@
+"""
+Compact in-memory option chains and a shared, memory-bounded store for them.
+
+compact_chain() shrinks an enriched chain: float32 numbers, int16 day counts, a categorical
+call type and a shared dictionary of expiration dates (categorical) instead of one timestamp per row.
+ChainStore keeps chains (or IndexedChains, see engine.load_dataset) for every session and ticker in one place, keyed by what
+they were built from. Identical requests (Home sessions, screener runs) share a single copy. An entry
+put with a group replaces the other entries of that group (e.g. older versions of one dataset), and the
+least recently used entries are evicted once the configured memory ceiling (CHAIN_MEMORY_LIMIT_MB)
+is exceeded.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import options
+
+CHAIN_MEMORY_LIMIT_MB = float(os.environ.get("CHAIN_MEMORY_LIMIT_MB", 512))
+
+
+def compact_chain(chain):
+    """Copy of an enriched chain with compact column types (see module docstring)."""
+    compact = chain.copy()
+    for column in compact.columns:
+        values = compact[column]
+        if column == "call_type":
+            compact[column] = pd.Categorical(values, categories=options.CALL_TYPES)
+        elif column in ("ticker", "expiration"):
+            compact[column] = values.astype("category")
+        elif column == "days_to_expiration":
+            # int16, not the smallest type that fits: int8 would overflow in day arithmetic (e.g. + settlement
+            # days) and flip dtype between windows shorter and longer than 127 days
+            compact[column] = values.astype(np.int16)
+        elif values.dtype == np.float64:
+            compact[column] = values.astype(np.float32)
+    return compact
+
+
+def memory_bytes(chain):
+    """Bytes held by a DataFrame or an IndexedChain (data plus its indexes)."""
+    if hasattr(chain, "nbytes"):
+        return chain.nbytes
+    return int(chain.memory_usage(index=True, deep=True).sum())
+
+
+def bytes_per_contract(chain):
+    """Average memory per contract (row)."""
+    return memory_bytes(chain) / max(len(chain), 1)
+
+
+class ChainStore:
+    """Thread-safe LRU store of chains, bounded by total memory."""
+
+    def __init__(self, max_bytes=CHAIN_MEMORY_LIMIT_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (chain, bytes, group)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        """Stored chain for key (and mark it recently used), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, chain, group=None):
+        """
+        Store a chain, evicting the least recently used ones while over the memory ceiling.
+        group: entries stored with the same group are replaced by this one (e.g. a dataset's older versions)
+        """
+        size = memory_bytes(chain)
+        with self._lock:
+            if group is not None:
+                for stale in [k for k, entry in self._entries.items() if entry[2] == group and k != key]:
+                    del self._entries[stale]
+            self._entries[key] = (chain, size, group)
+            self._entries.move_to_end(key)
+            # Always keep the newest entry, even if it alone is over the ceiling
+            while len(self._entries) > 1 and self.total_bytes > self.max_bytes:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return chain
+
+    @property
+    def total_bytes(self):
+        return sum(size for _, size, _ in self._entries.values())
+
+    def stats(self):
+        """Entries, contracts, bytes and bytes per contract currently held."""
+        with self._lock:
+            contracts = sum(len(chain) for chain, _, _ in self._entries.values())
+            total = self.total_bytes
+            return {
+                "entries": len(self._entries),
+                "contracts": contracts,
+                "bytes": total,
+                "bytes_per_contract": total / contracts if contracts else 0.0,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_store():
+    """Process-wide store shared by every Streamlit session and screener run."""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = ChainStore()
+        return _shared_store
@@ -0,0 +1,83 @@
+"""
+Command line covered call screen, without Streamlit.
+
+    python cli.py AAPL MSFT NVDA --first 30 --last 90 --min-aarr 15 --output screen.csv
+    python cli.py AAPL --call-types OTM "Deep OTM" --sort "Premium (Highest)" --output screen.parquet
+
+Runs the same pipeline as the Home page (engine.py via screener.py) for every ticker and writes one
+ranked table as CSV or Parquet (by file extension, or --format). Without --output the top rows are
+printed. Parquet needs pyarrow (installed with Streamlit) or fastparquet.
+"""
+
+import argparse
+import os
+import sys
+
+import options
+import screener
+
+# Call types by their label without the emoji ("OTM" -> "🟢 OTM")
+CALL_TYPE_NAMES = {call_type.split(" ", 1)[1]: call_type for call_type in options.CALL_TYPES}
+
+
+def write_table(table, path, file_format=None):
+    """Write the screen to CSV or Parquet."""
+    file_format = file_format or ("parquet" if os.path.splitext(path)[1].lower() in (".parquet", ".pq") else "csv")
+    if file_format == "parquet":
+        try:
+            table.to_parquet(path, index=False)
+        except ImportError as e:
+            raise SystemExit(f"Writing Parquet needs pyarrow or fastparquet: {e}")
+    else:
+        table.to_csv(path, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screen covered calls for a list of tickers.")
+    parser.add_argument("tickers", nargs="+", help="ticker symbols")
+    parser.add_argument("--first", type=int, default=30, help="first expiration, in days from today")
+    parser.add_argument("--last", type=int, default=90, help="last expiration, in days from today")
+    parser.add_argument("--call-types", nargs="+", choices=list(CALL_TYPE_NAMES), help="only these call types")
+    parser.add_argument("--min-strike", type=float, default=0)
+    parser.add_argument("--max-strike", type=float, default=0)
+    parser.add_argument("--min-premium", type=float, default=0)
+    parser.add_argument("--max-premium", type=float, default=0)
+    parser.add_argument("--min-aarr", type=float, default=0, help="minimum max AARR, in percent")
+    parser.add_argument("--max-aarr", type=float, default=0, help="maximum max AARR, in percent")
+    parser.add_argument("--sort", default="AARR (Highest)", choices=options.SORT_OPTIONS)
+    parser.add_argument("--output", "-o", help="output file (.csv or .parquet)")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="output format (default: from the extension)")
+    parser.add_argument("--top", type=int, default=20, help="rows printed when there's no --output")
+    args = parser.parse_args(argv)
+
+    def progress(done, total, ticker, error):
+        status = f"failed: {error}" if error else "ok"
+        print(f"[{done}/{total}] {ticker} {status}", file=sys.stderr)
+
+    ranked, errors = screener.screen_tickers(
+        args.tickers,
+        first_expiration=args.first,
+        last_expiration=args.last,
+        call_types=[CALL_TYPE_NAMES[name] for name in args.call_types] if args.call_types else None,
+        min_strike=args.min_strike,
+        max_strike=args.max_strike,
+        min_premium=args.min_premium,
+        max_premium=args.max_premium,
+        min_aarr=args.min_aarr,
+        max_aarr=args.max_aarr,
+        sort_by=args.sort,
+        progress=progress,
+    )
+
+    if args.output:
+        write_table(ranked, args.output, args.format)
+        print(f"Wrote {len(ranked)} calls to {args.output}", file=sys.stderr)
+    elif not ranked.empty:
+        print(ranked.head(args.top).to_string(index=False))
+
+    # Failing only if nothing could be screened
+    return 1 if errors and len(errors) == len(set(t.strip().upper() for t in args.tickers)) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
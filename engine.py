@@ -0,0 +1,64 @@
+"""
+Headless covered call engine: fetch, enrich and score option chains without Streamlit.
+
+Home.py, the screener and cli.py all go through these functions, so batch jobs and other services
+get the same numbers as the app without importing or running Streamlit. Upstream data is memoized
+in-process (caching.ttl_cache), fetched chains are refreshed incrementally (chain_refresh) and
+enriched datasets live in the shared chain store.
+"""
+
+import options
+import utils
+from chain_index import IndexedChain
+from chain_store import compact_chain, get_shared_store
+from instrumentation import record_cache, span
+
+
+def market_snapshot(ticker):
+    """Spot, history, expirations and risk-free rate of a ticker (see utils.MarketSnapshot)."""
+    return utils.get_market_snapshot(ticker)
+
+
+def market_price(ticker):
+    """Current price of a ticker, or None if it can't be fetched."""
+    return utils.get_market_price(ticker)
+
+
+def historical_volatility(ticker, days=30):
+    """Annualized historical volatility over the last `days` trading days, or None."""
+    return utils.get_historical_volatility(ticker, days)
+
+
+def enrich_chain(chain, market_price, volatility=None, r=None):
+    """Add call types, Greeks and safety scores to a fetched chain."""
+    chain = options.add_call_types(chain, market_price)
+    return options.add_safety_scores(chain, market_price, volatility, r=r)
+
+
+def load_dataset(ticker, first_expiration, last_expiration, expected_aarr_method="grid"):
+    """
+    Enriched, compacted and indexed chain for one ticker and expiration window, from the shared
+    chain store or built and stored on a miss. The chain itself is refreshed incrementally first
+    (only stale expirations are refetched, see chain_refresh).
+    expected_aarr_method: see options.fetch_options_chain (e.g. "gbm" for Monte Carlo)
+
+    Returns:
+    - (IndexedChain, store key); the key includes the chain's version, so a dataset is rebuilt only
+      when the refreshed chain (quotes, spot, rate or volatilities) actually changed. A new version
+      replaces the older ones of the same (ticker, window, method) in the store.
+    """
+    snapshot = market_snapshot(ticker)
+    with span("engine.fetch"):
+        chain, version = options.refresh_options_chain(ticker, first_expiration=first_expiration,
+                                                       last_expiration=last_expiration,
+                                                       expected_aarr_method=expected_aarr_method)
+    dataset_key = (ticker.upper(), first_expiration, last_expiration, expected_aarr_method)
+    store_key = (*dataset_key, version)
+    store = get_shared_store()
+    dataset = store.get(store_key)
+    record_cache("chain_store", hit=dataset is not None)
+    if dataset is None:
+        chain = enrich_chain(chain, snapshot.spot, historical_volatility(ticker), r=snapshot.risk_free_rate)
+        with span("engine.compact_index"):
+            dataset = store.put(store_key, IndexedChain(compact_chain(chain)), group=dataset_key)
+    return dataset, store_key
@@ -0,0 +1,89 @@
+"""
+Import-time measurement and the cold-start budget of the app and the CLI.
+
+    python import_budget.py            # cold import time of every target against its budget
+    python import_budget.py --top 15   # plus the most expensive modules of each target
+
+Each target is imported in a fresh interpreter (best of a few runs, so the OS file cache is warm
+but nothing is preloaded). The per-module breakdown comes from `python -X importtime`. Exits
+non-zero when a target is over budget.
+
+Heavy dependencies that most runs don't need are imported on first use: rich (pretty_print),
+yfinance (only the live providers) and scipy (the normal distribution helpers in utils). pandas
+and numpy stay eager because every path that does real work needs them.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Cold-start budget per target, in seconds of import time (see README)
+TARGETS = {
+    "engine": (["engine"], 0.75),
+    "cli": (["cli"], 0.75),
+    # Home.py runs as a Streamlit script and can't be imported, so time what it imports
+    "app": (["streamlit", "engine", "options", "instrumentation", "chain_store"], 1.5),
+}
+RUNS = 3
+
+
+def _import_code(modules):
+    return f"import sys; sys.path.insert(0, {ROOT!r}); import time; start = time.perf_counter(); " \
+           f"import {', '.join(modules)}; print(time.perf_counter() - start)"
+
+
+def import_seconds(modules, runs=RUNS):
+    """Best import time of the modules in a fresh interpreter."""
+    best = float("inf")
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", _import_code(modules)], capture_output=True, text=True,
+                                check=True, cwd=ROOT).stdout
+        best = min(best, float(output.strip().splitlines()[-1]))
+    return best
+
+
+def module_costs(modules):
+    """(module, self seconds, cumulative seconds) for every module imported, from -X importtime."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", _import_code(modules)], capture_output=True,
+                            text=True, check=True, cwd=ROOT).stderr
+    costs = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        costs.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return costs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import times against the cold-start budget.")
+    parser.add_argument("targets", nargs="*", help=f"any of {', '.join(TARGETS)} (default: all)")
+    parser.add_argument("--top", type=int, default=0, help="show the N most expensive modules of each target")
+    parser.add_argument("--runs", type=int, default=RUNS, help="fresh interpreters per target (best is kept)")
+    args = parser.parse_args(argv)
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    over_budget = []
+    for target in args.targets or TARGETS:
+        modules, budget = TARGETS[target]
+        seconds = import_seconds(modules, args.runs)
+        status = "ok" if seconds <= budget else "OVER BUDGET"
+        if seconds > budget:
+            over_budget.append(target)
+        print(f"{target:<8} {seconds * 1000:7.0f} ms  (budget {budget * 1000:.0f} ms)  {status}")
+
+        if args.top:
+            costs = sorted(module_costs(modules), key=lambda cost: cost[2], reverse=True)
+            for name, self_seconds, cumulative in costs[:args.top]:
+                print(f"    {cumulative * 1000:8.1f} ms cumulative {self_seconds * 1000:8.1f} ms self  {name}")
+
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
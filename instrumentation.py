@@ -0,0 +1,228 @@
+"""
+Lightweight stage-level instrumentation: spans with wall time, call counts, cache hits / misses
+and (optionally) tracemalloc peaks, collected per request.
+
+    with instrumentation.trace(memory=True) as trace:
+        with instrumentation.span("fetch"):
+            ...
+    trace.to_json()
+
+(start_trace() / end_trace() do the same without the block; the block also ends the trace when the
+body raises or Streamlit stops, reruns or switches pages.)
+
+Spans are free when no trace is active (the library code is always instrumented, only Home.py's debug
+panel starts traces). The active trace lives in a context variable: worker threads see it when the
+task is submitted through contextvars.copy_context().run.
+
+Caches report their hits and misses through record_cache() (caching.ttl_cache does so for every
+memoized function).
+
+Set TRACE_LOG_PATH to append every finished trace to that file as one JSON line, for aggregation
+across requests.
+
+Memory peaks come from tracemalloc, which is process-wide: with several threads allocating at once a
+span's peak includes their allocations too. tracemalloc is started by the first memory trace and
+stopped when the last one ends (unless it was already running).
+"""
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+TRACE_LOG_PATH = os.environ.get("TRACE_LOG_PATH")
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+_current_span = contextvars.ContextVar("span", default=None)
+_log_lock = threading.Lock()
+
+# Memory traces currently running, and whether tracemalloc was started by them
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def _acquire_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+
+def _release_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+class _SpanRecord:
+    """One open span: timing and the memory bookkeeping needed for nested peaks."""
+
+    def __init__(self, name, parent, memory):
+        self.name = name
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.peak = 0
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                # Resetting the peak below would lose the parent's peak so far
+                parent.peak = max(parent.peak, peak)
+            tracemalloc.reset_peak()
+            self.base = current
+
+    def close(self, memory):
+        self.seconds = time.perf_counter() - self.start
+        if memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, self.peak)
+            return max(self.peak - self.base, 0)
+        return None
+
+
+class Trace:
+    """Spans, counters and cache statistics of one request."""
+
+    def __init__(self, request_id=None, memory=False):
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.memory = memory
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.spans = {}  # name -> {"calls", "seconds", "max_seconds", "peak_mb"}
+        self.events = []  # every span in start order: name, parent, offset, seconds
+        self.caches = {}  # cache name -> {"hits", "misses"}
+        self._lock = threading.Lock()
+        self._holds_tracemalloc = False
+
+    def _add_span(self, record, peak_bytes):
+        with self._lock:
+            stats = self.spans.setdefault(record.name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "peak_mb": None})
+            stats["calls"] += 1
+            stats["seconds"] += record.seconds
+            stats["max_seconds"] = max(stats["max_seconds"], record.seconds)
+            if peak_bytes is not None:
+                stats["peak_mb"] = max(stats["peak_mb"] or 0.0, peak_bytes / 1024**2)
+            self.events.append({
+                "name": record.name,
+                "parent": record.parent.name if record.parent is not None else None,
+                "offset": record.start - self.start,
+                "seconds": record.seconds,
+            })
+
+    def record_cache(self, cache, hit):
+        with self._lock:
+            stats = self.caches.setdefault(cache, {"hits": 0, "misses": 0})
+            stats["hits" if hit else "misses"] += 1
+
+    def span_rows(self):
+        """One row per span name, in first-start order."""
+        order = list(dict.fromkeys(event["name"] for event in sorted(self.events, key=lambda e: e["offset"])))
+        return [{"span": name, **self.spans[name]} for name in order]
+
+    def to_dict(self):
+        return {
+            "request_id": self.request_id,
+            "started_at": self.started_at,
+            "seconds": self.seconds,
+            "memory": self.memory,
+            "spans": self.span_rows(),
+            "caches": self.caches,
+            "events": sorted(self.events, key=lambda e: e["offset"]),
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+def start_trace(request_id=None, memory=False):
+    """Start collecting spans for a new request in the current context (and threads it's copied to)."""
+    if _current_trace.get() is not None:
+        # A trace that was never ended (its run was cut short) must not keep tracemalloc running
+        end_trace()
+    trace = Trace(request_id, memory)
+    if memory:
+        _acquire_tracemalloc()
+        trace._holds_tracemalloc = True
+    _current_trace.set(trace)
+    _current_span.set(None)
+    return trace
+
+
+def end_trace():
+    """Stop collecting; returns the finished trace (or None if none was active)."""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    trace.seconds = time.perf_counter() - trace.start
+    if trace._holds_tracemalloc:
+        trace._holds_tracemalloc = False
+        _release_tracemalloc()
+    _current_trace.set(None)
+    if TRACE_LOG_PATH:
+        with _log_lock, open(TRACE_LOG_PATH, "a") as f:
+            f.write(trace.to_json() + "\n")
+    return trace
+
+
+@contextmanager
+def trace(request_id=None, memory=False):
+    """start_trace() for the enclosed block; the trace is ended however the block exits."""
+    active = start_trace(request_id, memory)
+    try:
+        yield active
+    finally:
+        end_trace()
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as a stage of the active trace (no-op without one)."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    parent = _current_span.get()
+    record = _SpanRecord(name, parent, trace.memory)
+    token = _current_span.set(record)
+    try:
+        yield
+    finally:
+        _current_span.reset(token)
+        peak_bytes = record.close(trace.memory)
+        trace._add_span(record, peak_bytes)
+
+
+def traced(name=None):
+    """Decorator: run the function inside span(name), the function name by default."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache, hit):
+    """Count a hit or miss of a cache in the active trace (no-op without one)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record_cache(cache, hit)
@@ -0,0 +1,167 @@
+"""
+Implied volatility surface built from an already-fetched option chain.
+
+Every (strike, expiry) quote is inverted through Black-Scholes with a vectorized Newton solver that
+falls back to bisection, so the whole chain is solved in a handful of array passes. The surface
+interpolates linearly in log-moneyness within an expiry and linearly in total variance (iv^2 * T)
+across expiries, with flat extrapolation outside the quoted range.
+Surfaces are cached per ticker market snapshot and quotes, so a refresh whose quotes didn't change
+(a rerun, another expected AARR method, another session) reuses the surface instead of rebuilding it.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import utils
+
+# Volatility search bracket and solver settings
+IV_MIN = 1e-4
+IV_MAX = 5.0
+IV_TOLERANCE = 1e-6  # absolute price error
+IV_MAX_ITERATIONS = 100
+
+# Number of (snapshot, quotes) surfaces kept in memory
+SURFACE_CACHE_SIZE = 32
+
+
+def implied_volatility(prices, S, K, T, r):
+    """
+    Implied volatility of European calls, vectorized over prices / K / T.
+    Returns NaN where no volatility in [IV_MIN, IV_MAX] reproduces the price (e.g. below intrinsic value).
+    """
+    prices, K, T = np.broadcast_arrays(
+        np.asarray(prices, dtype=float), np.asarray(K, dtype=float), np.asarray(T, dtype=float)
+    )
+    shape = prices.shape
+    prices, K, T = prices.ravel(), K.ravel(), T.ravel()
+
+    # Arbitrage bounds for a call: intrinsic value < price < spot
+    with np.errstate(invalid="ignore"):
+        intrinsic = np.maximum(S - K * np.exp(-r * T), 0)
+        valid = np.isfinite(prices) & (T > 0) & (K > 0) & (prices > intrinsic) & (prices < S)
+
+    sigma = np.full(prices.shape, 0.3)
+    low = np.full(prices.shape, IV_MIN)
+    high = np.full(prices.shape, IV_MAX)
+    active = valid.copy()
+
+    for _ in range(IV_MAX_ITERATIONS):
+        idx = np.flatnonzero(active)
+        if len(idx) == 0:
+            break
+        s, k, t = sigma[idx], K[idx], T[idx]
+        diff = utils.black_scholes_call_price(S, k, t, r, s) - prices[idx]
+
+        converged = np.abs(diff) < IV_TOLERANCE
+        active[idx[converged]] = False
+
+        # Price increases with volatility, so the sign of the error tightens the bracket
+        high[idx] = np.where(diff > 0, s, high[idx])
+        low[idx] = np.where(diff < 0, s, low[idx])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            d1 = (np.log(S / k) + (r + 0.5 * s**2) * t) / (s * np.sqrt(t))
+            vega = S * utils.get_norm().pdf(d1) * np.sqrt(t)
+            newton = s - diff / vega
+
+        # Bisect whenever the Newton step leaves the bracket (or vega vanished)
+        in_bracket = (newton > low[idx]) & (newton < high[idx])
+        step = np.where(in_bracket, newton, (low[idx] + high[idx]) / 2)
+        sigma[idx] = np.where(converged, s, step)
+
+    # Prices that never converged have collapsed onto one end of the bracket: unsolvable
+    unsolved = (sigma <= IV_MIN * 1.0001) | (sigma >= IV_MAX * 0.9999)
+    sigma[~valid | unsolved] = np.nan
+    return sigma.reshape(shape)
+
+
+class IVSurface:
+    """Interpolated implied volatility by (strike, days to expiry)."""
+
+    def __init__(self, spot, strikes, days, ivs):
+        self.spot = spot
+        strikes = np.asarray(strikes, dtype=float)
+        days = np.asarray(days, dtype=float)
+        ivs = np.asarray(ivs, dtype=float)
+
+        keep = np.isfinite(ivs) & (days > 0)
+        strikes, days, ivs = strikes[keep], days[keep], ivs[keep]
+
+        # One smile per expiry, sorted by log-moneyness
+        self.days = np.unique(days)
+        self.smiles = []
+        for d in self.days:
+            in_slice = days == d
+            moneyness = np.log(strikes[in_slice] / spot)
+            order = np.argsort(moneyness)
+            self.smiles.append((moneyness[order], ivs[in_slice][order]))
+
+    @property
+    def empty(self):
+        return len(self.days) == 0
+
+    def volatility(self, strikes, days):
+        """Implied volatility at each (strike, days) pair; NaN if the surface has no quotes."""
+        strikes, days = np.broadcast_arrays(np.asarray(strikes, dtype=float), np.asarray(days, dtype=float))
+        if self.empty:
+            return np.full(strikes.shape, np.nan)
+
+        moneyness = np.log(strikes / self.spot).ravel()
+        days = days.ravel()
+
+        # Smile of every expiry evaluated at every query strike: (expiries, queries)
+        by_expiry = np.array([np.interp(moneyness, x, y) for x, y in self.smiles])
+        if len(self.days) == 1:
+            return by_expiry[0].reshape(strikes.shape)
+
+        # Linear in total variance between the two neighbouring expiries, flat outside
+        clipped = np.clip(days, self.days[0], self.days[-1])
+        upper = np.clip(np.searchsorted(self.days, clipped), 1, len(self.days) - 1)
+        lower = upper - 1
+        cols = np.arange(len(days))
+        t_low, t_high = self.days[lower] / 365.0, self.days[upper] / 365.0
+        w_low = by_expiry[lower, cols] ** 2 * t_low
+        w_high = by_expiry[upper, cols] ** 2 * t_high
+        t = clipped / 365.0
+        w = w_low + (w_high - w_low) * (t - t_low) / (t_high - t_low)
+        return np.sqrt(w / t).reshape(strikes.shape)
+
+
+def quote_prices(calls):
+    """Bid/ask midpoint where both sides are quoted, last trade price otherwise."""
+    last = calls["lastPrice"].to_numpy(dtype=float)
+    if "bid" not in calls.columns or "ask" not in calls.columns:
+        return last
+    bid = calls["bid"].to_numpy(dtype=float)
+    ask = calls["ask"].to_numpy(dtype=float)
+    return np.where((bid > 0) & (ask > bid), (bid + ask) / 2, last)
+
+
+_surfaces = OrderedDict()
+_surfaces_lock = threading.Lock()
+
+
+def _surface_key(snapshot, quotes):
+    return (snapshot.ticker, snapshot.fetched_at, quotes)
+
+
+def cache_surface(snapshot, quotes, surface):
+    """Remember the surface built for this market snapshot from quotes (a fingerprint of the quotes)."""
+    key = _surface_key(snapshot, quotes)
+    with _surfaces_lock:
+        _surfaces[key] = surface
+        _surfaces.move_to_end(key)
+        while len(_surfaces) > SURFACE_CACHE_SIZE:
+            _surfaces.popitem(last=False)
+
+
+def get_cached_surface(snapshot, quotes):
+    """Surface built for this market snapshot from these quotes, or None."""
+    key = _surface_key(snapshot, quotes)
+    with _surfaces_lock:
+        surface = _surfaces.get(key)
+        if surface is not None:
+            _surfaces.move_to_end(key)
+        return surface
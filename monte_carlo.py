@@ -0,0 +1,249 @@
+"""
+Monte Carlo expected AARR under alternative terminal price models.
+
+The lognormal expected AARR (utils.compute_expected_aarr_batch) integrates against one closed-form
+distribution. Here terminal prices are simulated instead, under one of MODELS:
+- "gbm": geometric Brownian motion, the same lognormal as the closed form (zero drift, price is a martingale)
+- "bootstrap": sums of daily log returns resampled from the ticker's price history (fat tails and
+  skew as they happened), with the drift removed so the price is a martingale too
+- "jump": Merton jump diffusion, GBM plus Poisson jumps with normal log sizes (compensated drift)
+
+Paths are simulated once per (ticker, horizon) and reused by every contract with that horizon.
+They are stored as standardized shocks, so contracts with different volatilities (e.g. from the IV
+surface) share them. Draws are seeded per horizon, so results don't depend on which contracts are
+evaluated together. Contracts x paths are evaluated in chunks of at most MAX_CHUNK_ELEMENTS.
+
+For every contract the AARR distribution is reported: the mean (expected AARR), percentiles and
+the probability of a loss. AARR only depends on min(final price, strike) and never decreases with
+it, so its percentiles are the AARR at the final price percentiles.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+MODELS = ("gbm", "bootstrap", "jump")
+MODEL_LABELS = {
+    "gbm": "Geometric Brownian motion",
+    "bootstrap": "Historical bootstrap",
+    "jump": "Jump diffusion (Merton)",
+}
+
+# Simulated paths per horizon and the default seed
+DEFAULT_PATHS = 20_000
+DEFAULT_SEED = 0
+
+# Contracts x paths evaluated at once (bounds the AARR matrix: 2M float64 = 16 MB)
+MAX_CHUNK_ELEMENTS = 2_000_000
+
+# AARR percentiles reported per contract
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Bootstrap: trading days per calendar year (horizons are in calendar days)
+TRADING_DAYS = 252
+
+# Jump diffusion: jumps per year, mean and std of the log jump size
+JUMP_INTENSITY = 1.0
+JUMP_MEAN = -0.05
+JUMP_STD = 0.10
+
+# Number of (ticker, model, horizon, ...) path sets kept in memory
+PATH_CACHE_SIZE = 128
+
+
+class PathSet:
+    """
+    Simulated terminal log returns of one horizon, as standardized shocks.
+    gbm / jump: diffusion shocks z ~ N(0, 1) (plus the summed log jumps), scaled by each contract's volatility.
+    bootstrap: the log returns themselves (the volatility is the history's own).
+    """
+
+    def __init__(self, model, days, shocks, jumps=None):
+        self.model = model
+        self.days = days
+        self.t = days / 365.0
+        self.shocks = shocks
+        self.jumps = jumps
+
+    @property
+    def n_paths(self):
+        return len(self.shocks)
+
+    @property
+    def needs_volatility(self):
+        return self.model != "bootstrap"
+
+    def _drift_and_scale(self, volatility):
+        volatility = np.asarray(volatility, dtype=float)
+        drift = -0.5 * volatility**2 * self.t
+        if self.model == "jump":
+            # Compensate the expected jump so the price stays a martingale
+            drift = drift - JUMP_INTENSITY * self.t * (np.exp(JUMP_MEAN + 0.5 * JUMP_STD**2) - 1)
+        return drift, volatility * np.sqrt(self.t)
+
+    def log_returns(self, volatility=None):
+        """Terminal log returns, (contracts, paths) for one volatility per contract; (1, paths) for bootstrap."""
+        if not self.needs_volatility:
+            return self.shocks[None, :]
+        drift, scale = self._drift_and_scale(volatility)
+        log_returns = drift[:, None] + scale[:, None] * self.shocks[None, :]
+        if self.jumps is not None:
+            log_returns += self.jumps[None, :]
+        return log_returns
+
+    def log_return_quantiles(self, volatility, q):
+        """Percentiles q (0-100) of the terminal log return, (contracts, len(q))."""
+        q = np.asarray(q, dtype=float)
+        if self.model == "gbm":
+            # Monotone in the shock: quantiles of z, shifted and scaled per contract
+            drift, scale = self._drift_and_scale(volatility)
+            return drift[:, None] + scale[:, None] * np.percentile(self.shocks, q, method="inverted_cdf")[None, :]
+        if self.model == "bootstrap":
+            quantiles = np.percentile(self.shocks, q, method="inverted_cdf")
+            return np.broadcast_to(quantiles, (len(np.atleast_1d(volatility)), len(q)))
+        return np.percentile(self.log_returns(volatility), q, axis=1, method="inverted_cdf").T
+
+
+def _rng(seed, model, days):
+    return np.random.default_rng([seed, MODELS.index(model), int(days)])
+
+
+def _history_returns(history):
+    close = history["Close"].dropna().to_numpy(dtype=float)
+    returns = np.diff(np.log(close))
+    if len(returns) < 2:
+        raise ValueError("Bootstrap needs a price history with at least 3 closes")
+    return returns
+
+
+def simulate(model, days, n_paths=DEFAULT_PATHS, seed=DEFAULT_SEED, history=None):
+    """
+    Simulate one horizon (see PathSet).
+    history: daily price history with a Close column (bootstrap only)
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown Monte Carlo model: {model} (expected one of {', '.join(MODELS)})")
+    rng = _rng(seed, model, days)
+
+    if model == "bootstrap":
+        if history is None:
+            raise ValueError("The bootstrap model needs the ticker's price history")
+        returns = _history_returns(history)
+        steps = max(1, int(round(days * TRADING_DAYS / 365)))
+        # Resample in path chunks so the (paths, steps) index matrix stays bounded
+        chunk = max(1, MAX_CHUNK_ELEMENTS // steps)
+        sums = np.concatenate([
+            returns[rng.integers(0, len(returns), (min(chunk, n_paths - start), steps))].sum(axis=1)
+            for start in range(0, n_paths, chunk)
+        ])
+        # Remove the historical drift: E[exp(log return)] = 1, like the other models
+        return PathSet(model, days, sums - np.log(np.mean(np.exp(sums))))
+
+    shocks = rng.standard_normal(n_paths)
+    jumps = None
+    if model == "jump":
+        counts = rng.poisson(JUMP_INTENSITY * days / 365.0, n_paths)
+        jumps = counts * JUMP_MEAN + np.sqrt(counts) * JUMP_STD * rng.standard_normal(n_paths)
+    return PathSet(model, days, shocks, jumps)
+
+
+_paths = OrderedDict()
+_paths_lock = threading.Lock()
+
+
+def get_paths(model, days, n_paths=DEFAULT_PATHS, seed=DEFAULT_SEED, ticker=None, history=None):
+    """
+    simulate(), memoized per (ticker, model, horizon, paths, seed). Only bootstrap paths depend on
+    the ticker (through its history), so GBM and jump paths are shared by every ticker.
+    """
+    source = None
+    if model == "bootstrap" and history is not None:
+        close = history["Close"].dropna()
+        source = (ticker.upper() if ticker else None, len(close), close.index[-1] if len(close) else None,
+                  float(close.iloc[-1]) if len(close) else None)
+    key = (model, int(days), n_paths, seed, source)
+    with _paths_lock:
+        paths = _paths.get(key)
+        if paths is not None:
+            _paths.move_to_end(key)
+            return paths
+    paths = simulate(model, int(days), n_paths, seed, history)
+    with _paths_lock:
+        _paths[key] = paths
+        while len(_paths) > PATH_CACHE_SIZE:
+            _paths.popitem(last=False)
+    return paths
+
+
+def final_prices(market_price, days_to_expiry, volatility=None, model="gbm", ticker=None, history=None,
+                 n_paths=DEFAULT_PATHS, seed=DEFAULT_SEED):
+    """Simulated final prices of one horizon (the same paths aarr_distribution uses), e.g. for holding the stock."""
+    paths = get_paths(model, days_to_expiry, n_paths, seed, ticker, history)
+    return market_price * np.exp(paths.log_returns(np.atleast_1d(np.asarray(volatility, dtype=float)))[0])
+
+
+def percentile_column(q):
+    """Name of the column holding the q-th AARR percentile (e.g. aarr_p5)."""
+    return f"aarr_p{q:g}"
+
+
+def aarr_distribution(strikes, premiums, days_to_expiry, market_price, volatility=None, model="gbm", ticker=None,
+                      history=None, n_paths=DEFAULT_PATHS, seed=DEFAULT_SEED, percentiles=PERCENTILES):
+    """
+    Simulated AARR distribution of every contract (same AARR as compute_aarr, 3 settlement days included).
+
+    Arguments:
+    - strikes, premiums, days_to_expiry, volatility: one value per contract (volatility may be a scalar;
+      not used by the bootstrap model)
+    - market_price: current price of the stock
+    - model: one of MODELS
+    - ticker, history: the ticker and its daily price history (bootstrap only)
+    - n_paths, seed: paths per horizon and the seed they are drawn with
+
+    Returns:
+    - DataFrame, one row per contract: expected_aarr (mean), one aarr_p<q> column per percentile and
+      prob_loss (probability of AARR < 0, 0-1). Contracts with no days left or no usable volatility
+      get the max (strike-out) AARR everywhere, like compute_expected_aarr_batch.
+    """
+    strikes = np.atleast_1d(np.asarray(strikes, dtype=float))
+    premiums = np.atleast_1d(np.asarray(premiums, dtype=float))
+    days_to_expiry = np.atleast_1d(np.asarray(days_to_expiry, dtype=float))
+    volatility = np.atleast_1d(np.asarray(volatility if volatility is not None else np.nan, dtype=float))
+    strikes, premiums, days_to_expiry, volatility = np.broadcast_arrays(strikes, premiums, days_to_expiry, volatility)
+
+    # Fallback: simple AARR assuming the shares are called away
+    max_aarr, *_ = utils.compute_aarr_batch(100, market_price, strikes, premiums, days_to_expiry)
+    expected = max_aarr.astype(float)
+    quantiles = np.repeat(expected[:, None], len(percentiles), axis=1)
+    prob_loss = (expected < 0).astype(float)
+
+    usable = days_to_expiry > 0
+    if model != "bootstrap":
+        usable &= np.isfinite(volatility) & (volatility > 0)
+
+    for days in np.unique(days_to_expiry[usable]):
+        paths = get_paths(model, days, n_paths, seed, ticker, history)
+        rows = np.flatnonzero(usable & (days_to_expiry == days))
+        chunk = max(1, MAX_CHUNK_ELEMENTS // paths.n_paths)
+        for start in range(0, len(rows), chunk):
+            idx = rows[start:start + chunk]
+            final_prices = market_price * np.exp(paths.log_returns(volatility[idx]))
+            aarr, *_ = utils.compute_aarr_batch(100, market_price, strikes[idx, None], premiums[idx, None], days,
+                                                final_market_price=final_prices)
+            expected[idx] = aarr.mean(axis=1)
+            prob_loss[idx] = (aarr < 0).mean(axis=1)
+
+            # AARR is non-decreasing in the final price: percentiles of the price give those of AARR
+            price_quantiles = market_price * np.exp(paths.log_return_quantiles(volatility[idx], percentiles))
+            quantiles[idx], *_ = utils.compute_aarr_batch(100, market_price, strikes[idx, None], premiums[idx, None],
+                                                          days, final_market_price=price_quantiles)
+
+    result = pd.DataFrame({"expected_aarr": expected})
+    for column, q in enumerate(percentiles):
+        result[percentile_column(q)] = quantiles[:, column]
+    result["prob_loss"] = prob_loss
+    return result
@@ -1,24 +1,60 @@
-import yfinance as yf
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import utils
-import streamlit as st
-
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def fetch_options_chain(ticker: str, first_expiration, last_expiration=None, expiration_range=30):
+import chain_refresh
+from providers import get_provider
+from instrumentation import span, traced
+from caching import ttl_cache
+
+# Concurrent option chain requests (one per expiration) and how long to wait for each one, in seconds
+FETCH_MAX_WORKERS = 8
+FETCH_TIMEOUT = 20
+
+# Volatility used for expected AARR and safety scores: "iv" (implied volatility surface of the fetched chain,
+# interpolated for contracts whose own IV can't be solved; historical volatility only when no contract in the
+# window has a solvable IV) or "hv" (historical volatility only)
+VOLATILITY_SOURCE = "iv"
+
+def fetch_options_chain(ticker: str, first_expiration, last_expiration=None, expiration_range=30, expected_aarr_method="grid",
+						max_workers=FETCH_MAX_WORKERS, timeout=FETCH_TIMEOUT, volatility_source=VOLATILITY_SOURCE,
+						refresh_policy=chain_refresh.DEFAULT_POLICY):
 	"""
 	Fetch call options for a stock across all expiration dates within the given range [first,last].
+	Refreshed incrementally (chain_refresh): only stale expirations are refetched and only changed ones re-enriched.
 
 	Arguments:
 	- ticker: str, stock ticker
 	- first_expiration: str | int | None, earliest expiration date (e.g. '2024-06-15' or 30 for 30 days from today)
 	- last_expiration: str | int | None, latest expiration date (e.g. '2024-09-01' or 90 for 90 days from today)
+	- expected_aarr_method: "grid" (default, price grid from utils settings), "exact" (full lognormal integral)
+	  or a monte_carlo.MODELS model ("gbm", "bootstrap", "jump"), which also adds the aarr_p<q> percentile
+	  and prob_loss columns
+	- max_workers: int, max number of expirations fetched at the same time
+	- timeout: float, seconds to wait for each expiration before skipping it
+	- volatility_source: "iv" (default) or "hv", see VOLATILITY_SOURCE
+	- refresh_policy: chain_refresh.RefreshPolicy, how long each expiration stays fresh
 
 	Returns:
 	- DataFrame of call options within the expiration range
 	"""
-	stock = yf.Ticker(ticker)
-	available_dates = stock.options
+	return refresh_options_chain(ticker, first_expiration, last_expiration, expiration_range, expected_aarr_method,
+								 max_workers, timeout, volatility_source, refresh_policy)[0]
+
+
+@traced("fetch_options_chain")
+def refresh_options_chain(ticker: str, first_expiration, last_expiration=None, expiration_range=30, expected_aarr_method="grid",
+						  max_workers=FETCH_MAX_WORKERS, timeout=FETCH_TIMEOUT, volatility_source=VOLATILITY_SOURCE,
+						  refresh_policy=chain_refresh.DEFAULT_POLICY):
+	"""
+	fetch_options_chain plus the chain's version: (chain, version), where the version changes
+	exactly when the chain's content does (e.g. to key derived data on).
+	"""
+	# Spot and expirations come from the shared per-ticker snapshot (no extra round trips)
+	with span("fetch.snapshot"):
+		snapshot = utils.get_market_snapshot(ticker)
+	provider = get_provider()
+	available_dates = snapshot.expirations
 	if not available_dates:
 		raise ValueError("No options available for this ticker.")
 
@@ -49,53 +85,110 @@ def fetch_options_chain(ticker: str, first_expiration, last_expiration=None, exp
 	if len(expirations_in_range) == 0 or not expirations_in_range:
 		raise ValueError("No expirations found in the specified range.")
 
-	all_calls = []
-	for exp in expirations_in_range:
-		try:
-			opt_chain = stock.option_chain(exp)
-			calls = opt_chain.calls
-			calls["expiration"] = pd.to_datetime(exp)
-			calls["days_to_expiration"] = (calls["expiration"] - pd.Timestamp.now()).dt.days
-			all_calls.append(calls)
-		except Exception as e:
-			print(f"Skipping {exp} due to error: {e}")
-
-	if not all_calls:
-		raise ValueError("Failed to retrieve any call data.")
-
-	result = pd.concat(all_calls, ignore_index=True)
-	
-	# Get current market price once
-	market_price = utils.get_market_price(ticker)
-	
-	# Add AARR column
-	result["max_aarr"] = result.apply(
-		lambda row: utils.compute_aarr(
-			num_shares=100,
-			initial_market_price=market_price,
-			strike_price=row["strike"],
-			premium=row["lastPrice"],
-			expiry=row["days_to_expiration"],
-			final_market_price=row["strike"],  # Assume expiry price is at strike (this is always where max AARR is)
-			strike_out=True
-		)[0], axis=1
-	)
-
-	# Add Expected AARR (probability-weighted)
-	result["expected_aarr"] = result.apply(
-		lambda row: utils.compute_expected_aarr_for_call(
-			strike=row["strike"],
-			premium=row["lastPrice"],
-			days_to_expiry=row["days_to_expiration"],
+	book = chain_refresh.get_book(ticker, volatility_source, refresh_policy)
+	return book.refresh(snapshot, expirations_in_range, provider, expected_aarr_method,
+						max_concurrency=max_workers, timeout=timeout)
+
+
+CALL_TYPES = ["🔴 Deep ITM", "🟠 ITM", "🟡 ATM", "🟢 OTM", "🟢 Deep OTM"]
+
+# Strike / market price boundaries between neighbouring CALL_TYPES
+CALL_TYPE_THRESHOLDS = (0.95, 1.0, 1.05, 1.15)
+
+# Expected AARR methods by display label (see fetch_options_chain)
+EXPECTED_AARR_METHODS = {
+	"Lognormal (grid)": "grid",
+	"Lognormal (exact)": "exact",
+	"Monte Carlo: geometric Brownian motion": "gbm",
+	"Monte Carlo: historical bootstrap": "bootstrap",
+	"Monte Carlo: jump diffusion": "jump",
+}
+
+SORT_OPTIONS = [
+	"AARR (Highest)",
+	"AARR (Lowest)",
+	"Premium (Highest)",
+	"Days to Expiry (Soonest)",
+	"Safety Score (Safest First)"
+]
+
+
+def call_type_codes(strikes, market_price, thresholds=CALL_TYPE_THRESHOLDS):
+	"""
+	Index into CALL_TYPES of every strike, binning strike / market price by `thresholds`.
+	A strike exactly on an ITM-side boundary (<= 1) gets the less in-the-money type, one exactly
+	on an OTM-side boundary (> 1) the less out-of-the-money type.
+	"""
+	thresholds = np.asarray(thresholds, dtype=float)
+	if len(thresholds) != len(CALL_TYPES) - 1:
+		raise ValueError(f"Expected {len(CALL_TYPES) - 1} call type thresholds, got {len(thresholds)}")
+	strikes = np.asarray(strikes, dtype=float)[..., None]
+	edges = market_price * thresholds
+	crossed = np.where(thresholds > 1.0, strikes > edges, strikes >= edges)
+	return crossed.sum(axis=-1)
+
+
+def classify_calls(strikes, market_price, thresholds=CALL_TYPE_THRESHOLDS):
+	"""Call type (moneyness) of every strike, as a Categorical over CALL_TYPES."""
+	return pd.Categorical.from_codes(call_type_codes(np.ravel(strikes), market_price, thresholds), categories=CALL_TYPES)
+
+
+def classify_call(strike, market_price, thresholds=CALL_TYPE_THRESHOLDS):
+	"""Call type (moneyness) label for one strike."""
+	return CALL_TYPES[int(call_type_codes(strike, market_price, thresholds))]
+
+
+def add_call_types(chain, market_price, thresholds=CALL_TYPE_THRESHOLDS):
+	"""Add the call_type column."""
+	with span("enrich.call_types"):
+		chain["call_type"] = classify_calls(chain["strike"], market_price, thresholds)
+	return chain
+
+
+def add_safety_scores(chain, market_price, volatility=None, r=None):
+	"""
+	Add Greeks, raw safety score and the 0-10 normalized safety score.
+	Uses the chain's per-contract volatility column when it has one, otherwise `volatility`
+	(skipped if there's neither).
+	r: risk-free rate, e.g. from the ticker's market snapshot (looked up if None)
+	"""
+	if "volatility" in chain.columns:
+		volatility = chain["volatility"].values
+	elif not volatility:
+		return chain
+	with span("enrich.greeks"):
+		greeks = utils.compute_greeks(
+			strikes=chain["strike"].values,
+			premiums=chain["premium"].values,
 			market_price=market_price,
-			# volatility=utils.get_implied_volatility_from_options(ticker, days_to_expiry=row["days_to_expiration"])
-			volatility=utils.get_historical_volatility(ticker, days=row["days_to_expiration"])
-		), axis=1
-	)
+			days_to_expiry=chain["days_to_expiration"].values,
+			volatility=volatility,
+			r=r
+		)
+		chain[greeks.columns] = greeks.values
+	with span("enrich.safety_normalize"):
+		chain["safety_score"] = utils.normalize_safety_scores(chain["safety_score_raw"].values)
+	return chain
+
+
+def sort_columns(columns):
+	"""(column, ascending) behind each of SORT_OPTIONS for a chain with these columns."""
+	aarr_col = "expected_aarr" if "expected_aarr" in columns else "max_aarr"
+	return {
+		"AARR (Highest)": (aarr_col, False),
+		"AARR (Lowest)": (aarr_col, True),
+		"Premium (Highest)": ("premium", False),
+		"Days to Expiry (Soonest)": ("days_to_expiration", True),
+		"Safety Score (Safest First)": ("safety_score", False),
+	}
+
 
-	return result[["strike", "lastPrice", "expiration", "days_to_expiration", "max_aarr", "expected_aarr"]].rename(columns={
-		"lastPrice": "premium"
-	})
+def sort_chain(chain, sort_by):
+	"""Sort by one of SORT_OPTIONS and reset the index."""
+	sort_col, ascending = sort_columns(chain.columns)[sort_by]
+	if sort_col in chain.columns:
+		chain = chain.sort_values(sort_col, ascending=ascending, kind="stable")
+	return chain.reset_index(drop=True)
 
 
 def filter_conservative_calls(df, min_premium=0.5, max_days=6 * 30):
@@ -114,11 +207,10 @@ def filter_calls(df, strike_price, expiration_date=None):
 		df = df[df["expiration"] == pd.to_datetime(expiration_date)]
 	return df
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour
+@ttl_cache(ttl=3600)  # Cache for 1 hour
 def get_stock_fundamentals(ticker: str, text_format=True):
 	"""Get fundamental data for a stock."""
-	stock = yf.Ticker(ticker)
-	info = stock.info
+	info = get_provider().info(ticker)
 	fundamentals = {
 		"ticker": ticker.upper(),
 		"price": info.get("currentPrice"),
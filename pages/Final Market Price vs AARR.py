@@ -2,8 +2,25 @@ import streamlit as st
 import numpy as np
 import plotly.graph_objects as go
 import pandas as pd
-from utils import compute_aarr, compute_hold_aarr, calculate_price_probabilities
+from utils import compute_aarr_batch, compute_hold_aarr, calculate_price_probabilities
 import utils
+import options
+import engine
+import monte_carlo
+
+# Display label and explanation for each of options.CALL_TYPES
+CALL_TYPE_DESCRIPTIONS = {
+    "🔴 Deep ITM": ("🔴 Deep ITM (In-The-Money)",
+                   "This call is guaranteed to execute. You're essentially selling now at a discount but getting paid a huge premium upfront."),
+    "🟠 ITM": ("🟠 ITM (In-The-Money)",
+              "This call is very likely to execute. Lower upside potential but higher income now."),
+    "🟡 ATM": ("🟡 ATM (At-The-Money)",
+              "Balanced risk/reward. Good premium with reasonable upside if stock rises."),
+    "🟢 OTM": ("🟢 OTM (Out-Of-The-Money)",
+              "Lower premium but you keep shares if stock doesn't rise above strike."),
+    "🟢 Deep OTM": ("🟢 Deep OTM (Out-Of-The-Money)",
+                   "Small premium, but the shares are unlikely to be called away and you keep most of the upside."),
+}
 
 st.set_page_config(page_title="Covered Call AARR Viewer", layout="wide")
 
@@ -18,6 +35,12 @@ if not call:
     st.error("No covered call selected. Please go back and choose one.")
     st.stop()
 
+# Prefer the contract's own volatility (implied volatility surface) over the ticker's 30d HV
+volatility_label = "historical volatility"
+if call.get("volatility") and np.isfinite(call["volatility"]):
+    volatility = call["volatility"]
+    volatility_label = "volatility (implied where available)"
+
 st.subheader(f"{ticker.upper()} Covered Call")
 
 col1, col2, col3 = st.columns(3)
@@ -39,190 +62,186 @@ premium = call['premium']
 expiry = call['days_to_expiration']
 num_shares = 100
 
-# Generate x_prices from 50% to 300% of current price
-# NOTE x range is determined here!
-x_prices = np.linspace(initial_price * 0.5, initial_price * 1.5, 300) # TODO experiment with 300
-y_aarr_covered = []
-y_aarr_hold = []
-
-for final_price in x_prices:
-    # Covered call AARR
-    aarr_cc, *_ = compute_aarr(
+@st.cache_data(max_entries=256)
+def build_aarr_analysis(strike, premium, expiry, initial_price, volatility):
+    """
+    Curves, key points and the finished chart for one covered call.
+    Memoized on (strike, premium, expiry, spot, volatility), so navigating back and forth costs nothing.
+    """
+    # Generate x_prices from 50% to 150% of current price
+    # NOTE x range is determined here!
+    x_prices = np.linspace(initial_price * 0.5, initial_price * 1.5, 300) # TODO experiment with 300
+
+    # Covered call and just-hold AARR for every final price at once
+    y_aarr_covered, *_ = compute_aarr_batch(
         num_shares=num_shares,
         initial_market_price=initial_price,
         strike_price=strike,
         premium=premium,
         expiry=expiry,
-        final_market_price=final_price,
-        strike_out=(final_price >= strike)
+        final_market_price=x_prices
     )
-    y_aarr_covered.append(aarr_cc)
-    
-    # Just hold stock AARR
-    aarr_hold, *_ = compute_hold_aarr(
+    y_aarr_hold, _ = compute_hold_aarr(
         num_shares=num_shares,
         initial_market_price=initial_price,
-        final_market_price=final_price,
+        final_market_price=x_prices,
         days=expiry + 3
     )
-    y_aarr_hold.append(aarr_hold)
-
-# Calculate probabilities
-probabilities = calculate_price_probabilities(initial_price, x_prices, expiry, volatility)
-
-# Find key points
-x_zero = next((x for x, y in zip(x_prices, y_aarr_covered) if y >= 0), x_prices[0])
-# x_breakeven_vs_hold = next((x for x, (yc, yh) in enumerate(zip(y_aarr_covered, y_aarr_hold)) 
-#                             if yc <= yh and x >= initial_price), strike)
-# Find where covered call AARR drops below hold stock AARR (going upward from current price)
-x_breakeven_vs_hold = strike  # Default to strike if never crosses
-for i, (price, yc, yh) in enumerate(zip(x_prices, y_aarr_covered, y_aarr_hold)):
-    if price >= initial_price and yc <= yh:
-        x_breakeven_vs_hold = price
-        break
-
-# Find max AARR point
-max_aarr_idx = np.argmax(y_aarr_covered)
-x_max_aarr = x_prices[max_aarr_idx]
-y_max_aarr = y_aarr_covered[max_aarr_idx]
-
-# Calculate expected AARR (probability-weighted)
-expected_aarr_covered = np.average(y_aarr_covered, weights=probabilities)
-expected_aarr_hold = np.average(y_aarr_hold, weights=probabilities)
-
-fig = go.Figure()
-
-# Covered call line
-fig.add_trace(go.Scatter(
-    x=x_prices,
-    y=y_aarr_covered,
-    mode='lines',
-    name='Covered Call',
-    line=dict(color='orange', width=3),
-    hovertemplate='Price: $%{x:.2f}<br>AARR: %{y:.2f}%<extra></extra>'
-))
-
-# Hold stock line
-fig.add_trace(go.Scatter(
-    x=x_prices,
-    y=y_aarr_hold,
-    mode='lines',
-    name='Just Hold Stock',
-    line=dict(color='cyan', width=2, dash='dot'),
-    hovertemplate='Price: $%{x:.2f}<br>AARR: %{y:.2f}%<extra></extra>'
-))
-
-# Dynamic x-axis range with padding
-# x_min = min(min(x_prices), initial_price * 0.5)
-# x_max = max(max(x_prices), initial_price * 1.5)
-# x_pad = (x_max - x_min) * 0.1
-
-# Dynamic y-axis range with padding
-y_min = min(min(y_aarr_covered), min(y_aarr_hold))
-y_max = min(max(y_aarr_covered), max(y_aarr_hold))
-y_pad = (y_max - y_min) * 0.1
-
-# Probability density curve (fill between lines, not separate trace)
-if volatility:
-    # Create filled area showing probability distribution
-    # Normalize probabilities to 0-1 range for opacity
-    norm_probs = probabilities / probabilities.max()
-    
-    # Add subtle shading in high-probability regions
-    for i in range(len(x_prices) - 1):
-        if norm_probs[i] > 0.3:  # Only shade likely regions
-            fig.add_shape(
-                type="rect",
-                x0=x_prices[i],
-                x1=x_prices[i+1],
-                y0=y_min - y_pad,
-                y1=y_max + y_pad,
-                fillcolor=f"rgba(100, 150, 255, {norm_probs[i] * 0.15})",
-                line=dict(width=0),
-                layer="below"
-            )
-
-# Current price line (add to legend)
-fig.add_trace(go.Scatter(
-    x=[initial_price, initial_price],
-    y=[y_min - y_pad, y_max + y_pad],
-    mode='lines',
-    name='Current Price',
-    line=dict(color='red', dash='dash', width=1),
-    hovertemplate=f'Current: ${initial_price:.2f}<extra></extra>',
-    showlegend=True
-))
-
-# Strike price line (add to legend)
-fig.add_trace(go.Scatter(
-    x=[strike, strike],
-    y=[y_min - y_pad, y_max + y_pad],
-    mode='lines',
-    name='Strike Price',
-    line=dict(color='gray', dash='dash', width=2),
-    hovertemplate=f'Strike: ${strike:.2f}<extra></extra>',
-    showlegend=True
-))
-
-# Max AARR point
-fig.add_trace(go.Scatter(
-    x=[x_max_aarr],
-    y=[y_max_aarr],
-    mode='markers+text',
-    marker=dict(color='lime', size=12, symbol='star'),
-    text=[f"Max: {y_max_aarr:.1f}%<br>@ ${x_max_aarr:.2f}"],
-    textposition="top center",
-    textfont=dict(color='lime', size=11),
-    showlegend=False,
-    hovertemplate=f'<b>Max AARR Point</b><br>Price: ${x_max_aarr:.2f}<br>AARR: {y_max_aarr:.2f}%<extra></extra>'
-))
-
-# Zero AARR line (breakeven)
-fig.add_hline(
-    y=0,
-    line=dict(color='purple', dash='dot', width=1),
-    annotation_text="0% Return",
-    annotation_position="right"
-)
 
-fig.update_layout(
-    title="AARR vs Final Market Price at Expiry",
-    xaxis_title="Final Market Price at Expiry",
-    yaxis_title="AARR (%)",
-    #xaxis=dict(range=[x_min - x_pad, x_max + x_pad], dtick=25),
-    yaxis=dict(range=[y_min - y_pad, y_max + 2*y_pad], dtick=25),
-    height=600,
-    margin=dict(l=60, r=60, t=80, b=60),
-    hovermode="x unified",
-    template="plotly_dark",
-    legend=dict(
-        yanchor="top",
-        y=0.99,
-        xanchor="left",
-        x=0.01
+    # Calculate probabilities
+    probabilities = calculate_price_probabilities(initial_price, x_prices, expiry, volatility)
+
+    # Find key points
+    non_negative = np.flatnonzero(y_aarr_covered >= 0)
+    x_zero = x_prices[non_negative[0]] if len(non_negative) else x_prices[0]
+    # Find where covered call AARR drops below hold stock AARR (going upward from current price)
+    crossings = np.flatnonzero((x_prices >= initial_price) & (y_aarr_covered <= y_aarr_hold))
+    x_breakeven_vs_hold = x_prices[crossings[0]] if len(crossings) else strike  # Default to strike if never crosses
+
+    # Find max AARR point
+    max_aarr_idx = np.argmax(y_aarr_covered)
+    x_max_aarr = x_prices[max_aarr_idx]
+    y_max_aarr = y_aarr_covered[max_aarr_idx]
+
+    # Calculate expected AARR (probability-weighted)
+    expected_aarr_covered = np.average(y_aarr_covered, weights=probabilities)
+    expected_aarr_hold = np.average(y_aarr_hold, weights=probabilities)
+
+    fig = go.Figure()
+
+    # Dynamic y-axis range with padding
+    y_min = min(y_aarr_covered.min(), y_aarr_hold.min())
+    y_max = min(y_aarr_covered.max(), y_aarr_hold.max())
+    y_pad = (y_max - y_min) * 0.1
+
+    # Probability shading: one heatmap strip behind the curves instead of a shape per price step
+    if volatility:
+        # Normalize probabilities to 0-1 range for opacity, only shade likely regions
+        norm_probs = probabilities / probabilities.max()
+        band = np.where(norm_probs > 0.3, norm_probs, np.nan)[:-1]
+        fig.add_trace(go.Heatmap(
+            x=x_prices,  # cell edges: each cell spans one price step
+            y=[y_min - y_pad, y_max + y_pad],
+            z=[band],
+            zmin=0,
+            zmax=1,
+            colorscale=[[0, "rgba(100, 150, 255, 0)"], [1, "rgba(100, 150, 255, 0.15)"]],
+            showscale=False,
+            hoverinfo="skip",
+            name="Probability"
+        ))
+
+    # Covered call line
+    fig.add_trace(go.Scatter(
+        x=x_prices,
+        y=y_aarr_covered,
+        mode='lines',
+        name='Covered Call',
+        line=dict(color='orange', width=3),
+        hovertemplate='Price: $%{x:.2f}<br>AARR: %{y:.2f}%<extra></extra>'
+    ))
+
+    # Hold stock line
+    fig.add_trace(go.Scatter(
+        x=x_prices,
+        y=y_aarr_hold,
+        mode='lines',
+        name='Just Hold Stock',
+        line=dict(color='cyan', width=2, dash='dot'),
+        hovertemplate='Price: $%{x:.2f}<br>AARR: %{y:.2f}%<extra></extra>'
+    ))
+
+    # Current price line (add to legend)
+    fig.add_trace(go.Scatter(
+        x=[initial_price, initial_price],
+        y=[y_min - y_pad, y_max + y_pad],
+        mode='lines',
+        name='Current Price',
+        line=dict(color='red', dash='dash', width=1),
+        hovertemplate=f'Current: ${initial_price:.2f}<extra></extra>',
+        showlegend=True
+    ))
+
+    # Strike price line (add to legend)
+    fig.add_trace(go.Scatter(
+        x=[strike, strike],
+        y=[y_min - y_pad, y_max + y_pad],
+        mode='lines',
+        name='Strike Price',
+        line=dict(color='gray', dash='dash', width=2),
+        hovertemplate=f'Strike: ${strike:.2f}<extra></extra>',
+        showlegend=True
+    ))
+
+    # Max AARR point
+    fig.add_trace(go.Scatter(
+        x=[x_max_aarr],
+        y=[y_max_aarr],
+        mode='markers+text',
+        marker=dict(color='lime', size=12, symbol='star'),
+        text=[f"Max: {y_max_aarr:.1f}%<br>@ ${x_max_aarr:.2f}"],
+        textposition="top center",
+        textfont=dict(color='lime', size=11),
+        showlegend=False,
+        hovertemplate=f'<b>Max AARR Point</b><br>Price: ${x_max_aarr:.2f}<br>AARR: {y_max_aarr:.2f}%<extra></extra>'
+    ))
+
+    # Zero AARR line (breakeven)
+    fig.add_hline(
+        y=0,
+        line=dict(color='purple', dash='dot', width=1),
+        annotation_text="0% Return",
+        annotation_position="right"
+    )
+
+    fig.update_layout(
+        title="AARR vs Final Market Price at Expiry",
+        xaxis_title="Final Market Price at Expiry",
+        yaxis_title="AARR (%)",
+        yaxis=dict(range=[y_min - y_pad, y_max + 2*y_pad], dtick=25),
+        height=600,
+        margin=dict(l=60, r=60, t=80, b=60),
+        hovermode="x unified",
+        template="plotly_dark",
+        legend=dict(
+            yanchor="top",
+            y=0.99,
+            xanchor="left",
+            x=0.01
+        )
     )
+
+    analysis = {
+        "x_zero": float(x_zero),
+        "x_breakeven_vs_hold": float(x_breakeven_vs_hold),
+        "x_max_aarr": float(x_max_aarr),
+        "y_max_aarr": float(y_max_aarr),
+        "expected_aarr_covered": float(expected_aarr_covered),
+        "expected_aarr_hold": float(expected_aarr_hold),
+    }
+    return fig, analysis
+
+fig, analysis = build_aarr_analysis(
+    float(strike), float(premium), int(expiry), float(initial_price),
+    float(volatility) if volatility else None
 )
+x_zero = analysis["x_zero"]
+x_breakeven_vs_hold = analysis["x_breakeven_vs_hold"]
+x_max_aarr = analysis["x_max_aarr"]
+y_max_aarr = analysis["y_max_aarr"]
+expected_aarr_covered = analysis["expected_aarr_covered"]
+expected_aarr_hold = analysis["expected_aarr_hold"]
 
 st.plotly_chart(fig, use_container_width=True)
 
 # Analysis
 st.subheader("📋 Analysis")
 
-# Determine if ITM, ATM, or OTM
-if strike < initial_price * 0.85:
-    call_type = "🔴 Deep ITM (In-The-Money)"
-    call_explanation = "This call is guaranteed to execute. You're essentially selling now at a discount but getting paid a huge premium upfront."
-elif strike < initial_price:
-    call_type = "🟠 ITM (In-The-Money)"
-    call_explanation = "This call is very likely to execute. Lower upside potential but higher income now."
-elif strike <= initial_price * 1.15:
-    call_type = "🟡 ATM (At-The-Money)"
-    call_explanation = "Balanced risk/reward. Good premium with reasonable upside if stock rises."
-else:
-    call_type = "🟢 OTM (Out-Of-The-Money)"
-    call_explanation = "Lower premium but you keep shares if stock doesn't rise above strike."
+# Same moneyness classification as the Home page table
+call_type = options.classify_call(strike, initial_price)
+call_type_label, call_explanation = CALL_TYPE_DESCRIPTIONS[call_type]
 
-st.info(f"**Call Type:** {call_type}\n\n{call_explanation}")
+st.info(f"**Call Type:** {call_type_label}\n\n{call_explanation}")
 
 col1, col2, col3, col4 = st.columns(4)
 
@@ -244,8 +263,10 @@ with col3:
 
 # Don't recalculate - just get the value that was already computed
 selected_call = st.session_state.get("selected_call")
-safety_normalized = selected_call.get("safety_score_normalized", 5.0)  # It's already in the dict!
-safety_normalized = round(safety_normalized, 1) # 1 decimal
+safety_normalized = selected_call.get("safety_score", 5.0)  # It's already in the dict!
+if safety_normalized is None or not np.isfinite(safety_normalized):
+    safety_normalized = 5.0
+safety_normalized = round(float(safety_normalized), 1) # 1 decimal
 
 # Color code based on score
 if safety_normalized >= 7:
@@ -281,7 +302,57 @@ if volatility:
     else:
         st.warning(f"⚠️ Holding stock has {expected_aarr_hold - expected_aarr_covered:.1f}% higher expected return")
     
-    st.caption(f"Based on {volatility*100:.1f}% historical volatility over {expiry} days")
+    st.caption(f"Based on {volatility*100:.1f}% {volatility_label} over {expiry} days")
+
+# Monte Carlo distribution of the AARR under the chosen price model
+@st.cache_data(max_entries=256, ttl=300)
+def simulate_call(strike, premium, expiry, initial_price, volatility, model, ticker):
+    """AARR distribution (monte_carlo.aarr_distribution row) and expected hold AARR over the same paths."""
+    history = engine.market_snapshot(ticker).history if model == "bootstrap" else None
+    distribution = monte_carlo.aarr_distribution(strike, premium, expiry, initial_price, volatility, model=model,
+                                                 ticker=ticker, history=history).iloc[0]
+    final_prices = monte_carlo.final_prices(initial_price, expiry, volatility, model=model, ticker=ticker, history=history)
+    hold_aarr, _ = compute_hold_aarr(num_shares, initial_price, final_prices, expiry + 3)
+    return distribution.to_dict(), float(np.mean(hold_aarr))
+
+if "saved_mc_model" not in st.session_state:
+    st.session_state["saved_mc_model"] = "gbm"
+
+st.divider()
+st.markdown("### 🎰 Monte Carlo AARR Distribution")
+mc_model = st.selectbox(
+    "Price model",
+    list(monte_carlo.MODELS),
+    index=list(monte_carlo.MODELS).index(st.session_state["saved_mc_model"]),
+    format_func=monte_carlo.MODEL_LABELS.get,
+    key="mc_model_input",
+    on_change=lambda: st.session_state.update({"saved_mc_model": st.session_state["mc_model_input"]})
+)
+
+if expiry <= 0:
+    st.info("This call expires today, there's nothing left to simulate.")
+elif mc_model != "bootstrap" and not volatility:
+    st.info("This model needs a volatility, none is available for this call.")
+else:
+    distribution, mc_expected_hold = simulate_call(
+        float(strike), float(premium), int(expiry), float(initial_price),
+        float(volatility) if volatility else None, mc_model, ticker
+    )
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Expected AARR (Covered Call)", f"{distribution['expected_aarr']:.2f}%")
+    with col2:
+        st.metric("Expected AARR (Hold Stock)", f"{mc_expected_hold:.2f}%")
+    with col3:
+        st.metric("Probability of Loss", f"{distribution['prob_loss'] * 100:.1f}%")
+
+    percentile_cols = st.columns(len(monte_carlo.PERCENTILES))
+    for col, q in zip(percentile_cols, monte_carlo.PERCENTILES):
+        with col:
+            st.metric(f"{q}th percentile", f"{distribution[monte_carlo.percentile_column(q)]:.1f}%")
+
+    st.caption(f"{monte_carlo.DEFAULT_PATHS:,} simulated {expiry}-day price paths "
+               f"({monte_carlo.MODEL_LABELS[mc_model]}, seed {monte_carlo.DEFAULT_SEED})")
 
 # Key insights
 st.divider()
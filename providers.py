@@ -0,0 +1,171 @@
+"""
+Market data providers.
+
+Everything that needs upstream data (prices, history, option chains, fundamentals) goes through
+get_provider(), so the backend can be swapped without touching utils.py / options.py:
+
+- "yfinance" (default): live data from Yahoo Finance.
+- "record": live data from Yahoo Finance, every response is also saved to disk.
+- "replay": serves previously recorded responses from disk, no network at all.
+
+Select a backend with the MARKET_DATA_PROVIDER environment variable (and MARKET_DATA_DIR for where
+recordings live), or call set_provider() from code.
+"""
+
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+
+DEFAULT_DATA_DIR = "market_data"
+
+
+def _yfinance():
+    """yfinance, imported on first use (it's slow to import and replay runs never need it)."""
+    import yfinance
+    return yfinance
+
+
+class MarketDataProvider:
+    """Interface for market data backends."""
+
+    def history(self, ticker, period="1d"):
+        """Daily OHLC history as a DataFrame (same columns as yfinance)."""
+        raise NotImplementedError
+
+    def expirations(self, ticker):
+        """Available option expiration dates as a tuple of 'YYYY-MM-DD' strings."""
+        raise NotImplementedError
+
+    def option_calls(self, ticker, expiration):
+        """Call options for one expiration as a DataFrame (same columns as yfinance)."""
+        raise NotImplementedError
+
+    def info(self, ticker):
+        """Fundamentals dict (same keys as yfinance's Ticker.info)."""
+        raise NotImplementedError
+
+
+class YFinanceProvider(MarketDataProvider):
+    """
+    Live data from Yahoo Finance.
+    Every request gets a fresh yf.Ticker: a Ticker downloads its expirations only once, so a long-lived
+    one would keep serving (and validating chain requests against) a stale list. The tickers share one
+    pooled HTTP session, yfinance's own or `session` (e.g. a curl_cffi Session) if given, so the
+    connections stay warm.
+    """
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def _ticker(self, ticker):
+        return _yfinance().Ticker(ticker.upper(), session=self.session)
+
+    def history(self, ticker, period="1d"):
+        return self._ticker(ticker).history(period=period)
+
+    def expirations(self, ticker):
+        return tuple(self._ticker(ticker).options)
+
+    def option_calls(self, ticker, expiration):
+        return self._ticker(ticker).option_chain(expiration).calls
+
+    def info(self, ticker):
+        return self._ticker(ticker).info
+
+
+def _response_path(data_dir, method, *args):
+    """File that stores the response of method(*args)."""
+    readable = re.sub(r"[^A-Za-z0-9_.-]", "_", "_".join(str(a) for a in args))
+    digest = hashlib.sha1(repr(args).encode()).hexdigest()[:10]
+    return os.path.join(data_dir, method, f"{readable}_{digest}.pkl")
+
+
+class RecordingProvider(MarketDataProvider):
+    """Passes every request to another provider and saves the response to disk for ReplayProvider."""
+
+    def __init__(self, inner=None, data_dir=DEFAULT_DATA_DIR):
+        self.inner = inner or YFinanceProvider()
+        self.data_dir = data_dir
+
+    def _record(self, method, *args):
+        response = getattr(self.inner, method)(*args)
+        path = _response_path(self.data_dir, method, *args)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temp file first so a concurrent reader never sees a partial recording
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(response, f)
+        os.replace(tmp_path, path)
+        return response
+
+    def history(self, ticker, period="1d"):
+        return self._record("history", ticker, period)
+
+    def expirations(self, ticker):
+        return self._record("expirations", ticker)
+
+    def option_calls(self, ticker, expiration):
+        return self._record("option_calls", ticker, expiration)
+
+    def info(self, ticker):
+        return self._record("info", ticker)
+
+
+class ReplayProvider(MarketDataProvider):
+    """Serves responses saved by RecordingProvider. Raises LookupError for anything not recorded."""
+
+    def __init__(self, data_dir=DEFAULT_DATA_DIR):
+        self.data_dir = data_dir
+
+    def _replay(self, method, *args):
+        path = _response_path(self.data_dir, method, *args)
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            raise LookupError(f"No recorded {method} response for {args} in {self.data_dir}")
+
+    def history(self, ticker, period="1d"):
+        return self._replay("history", ticker, period)
+
+    def expirations(self, ticker):
+        return self._replay("expirations", ticker)
+
+    def option_calls(self, ticker, expiration):
+        return self._replay("option_calls", ticker, expiration)
+
+    def info(self, ticker):
+        return self._replay("info", ticker)
+
+
+def provider_from_env():
+    """Build the provider selected by MARKET_DATA_PROVIDER / MARKET_DATA_DIR."""
+    name = os.environ.get("MARKET_DATA_PROVIDER", "yfinance").lower()
+    data_dir = os.environ.get("MARKET_DATA_DIR", DEFAULT_DATA_DIR)
+    if name == "yfinance":
+        return YFinanceProvider()
+    if name == "record":
+        return RecordingProvider(data_dir=data_dir)
+    if name == "replay":
+        return ReplayProvider(data_dir=data_dir)
+    raise ValueError(f"Unknown market data provider: {name}")
+
+
+_provider = None
+
+
+def get_provider():
+    """Current market data provider."""
+    global _provider
+    if _provider is None:
+        _provider = provider_from_env()
+    return _provider
+
+
+def set_provider(provider):
+    """Use a different market data provider for every following request."""
+    global _provider
+    _provider = provider
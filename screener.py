@@ -0,0 +1,91 @@
+"""
+Multi-ticker covered call screener.
+
+Runs the same fetch -> enrich -> filter pipeline as Home.py for a whole watchlist, one ticker per
+worker thread, and returns a single table ranked across every ticker. Enriched chains come from the
+shared, memory-bounded chain store (see chain_store), so large watchlists stay under its ceiling.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+import engine
+import options
+from chain_store import compact_chain
+
+SCREEN_MAX_WORKERS = 8
+
+
+def screen_ticker(ticker, first_expiration=30, last_expiration=90, call_types=None, min_strike=0, max_strike=0,
+                  min_premium=0, max_premium=0, min_aarr=0, max_aarr=0):
+    """Fetch, enrich and filter the covered calls for one ticker (same steps as Home.py)."""
+    dataset, _ = engine.load_dataset(ticker, first_expiration, last_expiration)
+    chain = dataset.view(
+        call_types=call_types,
+        min_strike=min_strike,
+        max_strike=max_strike,
+        min_premium=min_premium,
+        max_premium=max_premium,
+        min_aarr=min_aarr,
+        max_aarr=max_aarr
+    )
+
+    chain.insert(0, "ticker", ticker.upper())
+    chain["stock_price"] = engine.market_snapshot(ticker).spot
+    return chain
+
+
+def screen_tickers(tickers, first_expiration=30, last_expiration=90, call_types=None, min_strike=0, max_strike=0,
+                   min_premium=0, max_premium=0, min_aarr=0, max_aarr=0, sort_by="AARR (Highest)",
+                   max_workers=SCREEN_MAX_WORKERS, progress=None):
+    """
+    Screen a list of tickers in parallel and rank the results across all of them.
+
+    Arguments:
+    - tickers: list of ticker symbols
+    - first_expiration / last_expiration and the filter arguments: same meaning as on the Home page
+    - sort_by: one of options.SORT_OPTIONS, applied to the combined table
+    - max_workers: number of tickers processed at the same time
+    - progress: optional callback(done, total, ticker, error), called as each ticker finishes
+      (error is None on success)
+
+    Returns:
+    - (DataFrame ranked across all tickers, dict of ticker -> error message for tickers that failed)
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+    filters = dict(
+        first_expiration=first_expiration,
+        last_expiration=last_expiration,
+        call_types=call_types,
+        min_strike=min_strike,
+        max_strike=max_strike,
+        min_premium=min_premium,
+        max_premium=max_premium,
+        min_aarr=min_aarr,
+        max_aarr=max_aarr,
+    )
+
+    results = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers) or 1))) as pool:
+        futures = {pool.submit(screen_ticker, ticker, **filters): ticker for ticker in tickers}
+        for done, future in enumerate(as_completed(futures), start=1):
+            ticker = futures[future]
+            # A failing ticker never takes the rest of the screen down
+            try:
+                results[ticker] = future.result()
+                error = None
+            except Exception as e:
+                error = errors[ticker] = str(e) or type(e).__name__
+            if progress is not None:
+                progress(done, len(tickers), ticker, error)
+
+    # Concatenate in watchlist order so ties rank the same way every run
+    chains = [results[t] for t in tickers if t in results and not results[t].empty]
+    if not chains:
+        return pd.DataFrame(), errors
+
+    ranked = compact_chain(options.sort_chain(pd.concat(chains, ignore_index=True), sort_by))
+    ranked.insert(0, "rank", range(1, len(ranked) + 1))
+    return ranked, errors
@@ -0,0 +1,243 @@
+"""
+Offline tests of the asyncio market data layer (async_data.py), against stub providers and a local
+HTTP stub server. Run from the repository root: python -m pytest tests
+
+Concurrency is proven with barriers that every request has to reach (they break if the requests run
+one after another) and in-flight counters, never with wall-clock bounds. Slow requests block on
+events instead of sleeping, so the timeout tests only need the timeout to be longer than an
+instant request.
+"""
+
+import asyncio
+import contextvars
+import json
+import threading
+import unittest
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+import async_data
+import instrumentation
+from providers import MarketDataProvider
+
+EXPIRATIONS = ("2030-01-04", "2030-01-11", "2030-01-18", "2030-01-25", "2030-02-01", "2030-02-08")
+
+# Upper bound for waits that only fail when something is broken (a barrier that never fills)
+WAIT = 10
+
+request_tag = contextvars.ContextVar("request_tag", default=None)
+
+
+class StubProvider(MarketDataProvider):
+    """
+    In-memory provider that counts how many requests run at once.
+    barrier: every option_calls request waits on it; gates: {expiration: Event} the request blocks on
+    """
+
+    def __init__(self, barrier=None, gates=None, fail=()):
+        self.barrier = barrier
+        self.gates = gates or {}
+        self.fail = set(fail)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.tags = []
+        self._lock = threading.Lock()
+
+    def _request(self, key):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.tags.append(request_tag.get())
+        try:
+            if key in self.gates:
+                self.gates[key].wait(WAIT)
+            elif self.barrier is not None and key in EXPIRATIONS:
+                self.barrier.wait()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def history(self, ticker, period="1d"):
+        if ticker in self.fail:
+            raise LookupError(ticker)
+        self._request(("history", ticker))
+        return pd.DataFrame({"Close": [99.0, 100.0]})
+
+    def expirations(self, ticker):
+        self._request(("expirations", ticker))
+        return EXPIRATIONS
+
+    def option_calls(self, ticker, expiration):
+        self._request(expiration)
+        return pd.DataFrame({"strike": [100.0], "lastPrice": [1.0], "expiration": [expiration]})
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    barrier = None
+
+    def do_GET(self):
+        # Answers only once every expected request is in flight at the same time
+        self.barrier.wait()
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPStubProvider(MarketDataProvider):
+    """Provider that serves option chains from a local HTTP stub server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def option_calls(self, ticker, expiration):
+        with urllib.request.urlopen(f"{self.base_url}/{ticker}/{expiration}", timeout=WAIT) as response:
+            return pd.DataFrame([json.load(response)])
+
+
+def release_later(event, seconds):
+    """Set `event` after `seconds` (on a timer thread)."""
+    timer = threading.Timer(seconds, event.set)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class AsyncMarketDataTest(unittest.TestCase):
+
+    def assertAllChains(self, chains, expirations=EXPIRATIONS):
+        self.assertEqual(list(chains), list(expirations))
+        for expiration, chain in chains.items():
+            self.assertIsInstance(chain, pd.DataFrame, f"{expiration}: {chain!r}")
+
+    def test_requests_run_concurrently(self):
+        # The barrier only lets requests through once all of them are in flight
+        provider = StubProvider(barrier=threading.Barrier(len(EXPIRATIONS), timeout=WAIT))
+        chains = async_data.fetch_option_chains("AAPL", EXPIRATIONS, provider=provider)
+        self.assertAllChains(chains)
+        self.assertEqual(provider.max_in_flight, len(EXPIRATIONS))
+
+    def test_concurrency_is_bounded(self):
+        provider = StubProvider(barrier=threading.Barrier(2, timeout=WAIT))
+        chains = async_data.fetch_option_chains("AAPL", EXPIRATIONS, provider=provider, max_concurrency=2)
+        self.assertAllChains(chains)
+        self.assertEqual(provider.max_in_flight, 2)
+
+    def test_timeout_is_per_request(self):
+        gate = threading.Event()
+        provider = StubProvider(gates={EXPIRATIONS[1]: gate})
+        try:
+            chains = async_data.fetch_option_chains("AAPL", EXPIRATIONS, timeout=0.5, provider=provider)
+        finally:
+            gate.set()
+        self.assertIsInstance(chains[EXPIRATIONS[1]], TimeoutError)
+        self.assertAllChains({e: chains[e] for e in EXPIRATIONS if e != EXPIRATIONS[1]},
+                             [e for e in EXPIRATIONS if e != EXPIRATIONS[1]])
+
+    def test_timeout_excludes_waiting_for_a_slot(self):
+        # The only slot is held by an untimed call for twice the request's timeout
+        provider = StubProvider()
+        gate = threading.Event()
+
+        async def fetch():
+            data = async_data.AsyncMarketData(provider, max_concurrency=1)
+            holder = asyncio.ensure_future(data.call(gate.wait, WAIT))
+            await asyncio.sleep(0)
+            release_later(gate, 1.0)
+            chain = await data.call(provider.option_calls, "AAPL", EXPIRATIONS[0], timeout=0.5)
+            await holder
+            return chain
+
+        try:
+            self.assertIsInstance(async_data.run(fetch()), pd.DataFrame)
+        finally:
+            gate.set()
+
+    def test_timeout_excludes_waiting_for_a_worker(self):
+        # Every worker of the shared pool is busy (e.g. with other screener threads) for twice the timeout
+        gate = threading.Event()
+        busy = [async_data._get_pool().submit(gate.wait, WAIT) for _ in range(async_data.POOL_SIZE)]
+        release_later(gate, 1.0)
+        try:
+            chains = async_data.fetch_option_chains("AAPL", EXPIRATIONS, timeout=0.5, provider=StubProvider())
+        finally:
+            gate.set()
+        for future in busy:
+            future.result()
+        self.assertAllChains(chains)
+
+    def test_timed_out_request_keeps_its_slot(self):
+        # The first request times out but keeps running; the others must wait for it to return
+        gate = threading.Event()
+        provider = StubProvider(gates={EXPIRATIONS[0]: gate})
+        release_later(gate, 1.0)
+        try:
+            chains = async_data.fetch_option_chains("AAPL", EXPIRATIONS[:3], timeout=0.3, provider=provider,
+                                                    max_concurrency=1)
+        finally:
+            gate.set()
+        self.assertIsInstance(chains[EXPIRATIONS[0]], TimeoutError)
+        self.assertAllChains({e: chains[e] for e in EXPIRATIONS[1:3]}, EXPIRATIONS[1:3])
+        self.assertEqual(provider.max_in_flight, 1)
+
+    def test_context_is_propagated(self):
+        provider = StubProvider()
+
+        def worker():
+            with instrumentation.span("worker"):
+                return request_tag.get()
+
+        token = request_tag.set("caller")
+        try:
+            with instrumentation.trace() as trace:
+                async_data.fetch_option_chains("AAPL", EXPIRATIONS, provider=provider)
+                tags = async_data.call_concurrently(worker, worker)
+        finally:
+            request_tag.reset(token)
+        self.assertEqual(provider.tags, ["caller"] * len(EXPIRATIONS))
+        self.assertEqual(tags, ["caller", "caller"])
+        self.assertEqual(trace.spans["worker"]["calls"], 2)
+
+    def test_sync_wrapper_inside_running_loop(self):
+        provider = StubProvider()
+
+        async def caller():
+            return async_data.fetch_option_chains("AAPL", EXPIRATIONS, provider=provider)
+
+        self.assertAllChains(asyncio.run(caller()))
+
+    def test_ticker_data_and_many(self):
+        provider = StubProvider(fail={"ZZZZ"})
+        results = async_data.fetch_many(["AAPL", "ZZZZ"], select_expiration=lambda e: e < "2030-01-15",
+                                        provider=provider)
+        self.assertIsInstance(results["ZZZZ"], LookupError)
+        data = results["AAPL"]
+        self.assertEqual(data["spot"], 100.0)
+        self.assertEqual(data["expirations"], EXPIRATIONS)
+        self.assertAllChains(data["chains"], EXPIRATIONS[:2])
+
+    def test_local_http_stub_server(self):
+        _StubHandler.barrier = threading.Barrier(len(EXPIRATIONS), timeout=WAIT)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            provider = HTTPStubProvider(f"http://127.0.0.1:{server.server_address[1]}")
+            chains = async_data.fetch_option_chains("AAPL", EXPIRATIONS, provider=provider)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertAllChains(chains)
+        self.assertEqual([chain["path"].iloc[0] for chain in chains.values()],
+                         [f"/AAPL/{expiration}" for expiration in EXPIRATIONS])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Offline tests of the incremental chain refresh (chain_refresh.py): a refreshed book must give the same
+chain as a full fetch into an empty book, while refetching and re-enriching only what changed.
+Run from the repository root: python -m pytest tests
+"""
+
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import chain_cache
+import chain_refresh
+import instrumentation
+import utils
+from providers import MarketDataProvider
+
+# Business days: the history has trading-day gaps like a real one
+HISTORY = pd.DataFrame(
+    {"Close": 100.0 * np.exp(np.cumsum(np.random.default_rng(5).normal(0, 0.015, 500)))},
+    index=pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=500),
+)
+
+EXPIRATIONS = tuple(str((pd.Timestamp.now() + pd.Timedelta(days=days)).date()) for days in (3, 10, 24, 45, 80, 150, 300))
+
+
+class StubProvider(MarketDataProvider):
+    """Synthetic Black-Scholes quotes (plus noise and a few unsolvable ones) that counts requests per expiration."""
+
+    def __init__(self, spot=100.0):
+        self.spot = spot
+        self.bumped = set()
+        self.requests = {}
+
+    def option_calls(self, ticker, expiration):
+        self.requests[expiration] = self.requests.get(expiration, 0) + 1
+        rng = np.random.default_rng(EXPIRATIONS.index(expiration))
+        strikes = np.arange(60.0, 165.0, 5.0)
+        t = max(chain_refresh.days_to_expiration(expiration), 1) / 365.0
+        prices = utils.black_scholes_call_price(self.spot, strikes, t, 0.04, rng.uniform(0.2, 0.5, len(strikes)))
+        prices = np.round(prices + rng.normal(0, 0.02, len(strikes)), 2)
+        prices[rng.random(len(strikes)) < 0.1] = 0.01
+        if expiration in self.bumped:
+            prices = prices + 0.05
+        return pd.DataFrame({"strike": strikes, "lastPrice": prices, "bid": prices - 0.05, "ask": prices + 0.05,
+                             "volume": rng.integers(0, 1000, len(strikes))})
+
+
+def snapshot(spot=100.0, r=0.04):
+    return utils.MarketSnapshot("STUB", spot, HISTORY, EXPIRATIONS, r, time.time())
+
+
+class ChainBookTest(unittest.TestCase):
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(chain_cache, "CACHE_ENABLED", False),
+            mock.patch.object(utils, "get_historical_volatilities",
+                              lambda ticker, windows: utils.historical_volatilities(HISTORY, windows)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.provider = StubProvider()
+
+    def full_fetch(self, snap, volatility_source="iv", method="grid"):
+        """The chain a fresh book (nothing cached) gives for the same quotes."""
+        return chain_refresh.ChainBook("STUB", volatility_source).refresh(snap, EXPIRATIONS, self.provider, method)
+
+    def expire(self, book):
+        for block in book.blocks.values():
+            block.fetched_at -= 10**7
+
+    def test_fresh_blocks_are_not_refetched(self):
+        book = chain_refresh.ChainBook("STUB")
+        snap = snapshot()
+        chain, version = book.refresh(snap, EXPIRATIONS, self.provider)
+        again, again_version = book.refresh(snap, EXPIRATIONS, self.provider)
+        self.assertEqual(self.provider.requests, {expiration: 1 for expiration in EXPIRATIONS})
+        self.assertEqual(version, again_version)
+        pd.testing.assert_frame_equal(chain, again)
+
+    def test_changed_quotes_match_full_fetch(self):
+        for volatility_source in ("iv", "hv"):
+            for method in ("grid", "exact"):
+                with self.subTest(volatility_source=volatility_source, method=method):
+                    self.provider.bumped = set()
+                    book = chain_refresh.ChainBook("STUB", volatility_source)
+                    snap = snapshot()
+                    _, version = book.refresh(snap, EXPIRATIONS, self.provider, method)
+
+                    self.expire(book)
+                    self.provider.bumped = {EXPIRATIONS[3]}
+                    with instrumentation.trace() as trace:
+                        chain, new_version = book.refresh(snap, EXPIRATIONS, self.provider, method)
+                    full, full_version = self.full_fetch(snap, volatility_source, method)
+
+                    pd.testing.assert_frame_equal(chain, full, check_exact=True)
+                    self.assertEqual(new_version, full_version)
+                    self.assertNotEqual(new_version, version)
+                    # Only the bumped block's quotes are re-solved
+                    self.assertEqual(trace.caches["block_quotes"], {"hits": len(EXPIRATIONS) - 1, "misses": 1})
+
+    def test_market_move_matches_full_fetch(self):
+        book = chain_refresh.ChainBook("STUB")
+        book.refresh(snapshot(), EXPIRATIONS, self.provider)
+        moved = snapshot(spot=103.0, r=0.045)
+        chain, version = book.refresh(moved, EXPIRATIONS, self.provider)
+        full, full_version = self.full_fetch(moved)
+        pd.testing.assert_frame_equal(chain, full, check_exact=True)
+        self.assertEqual(version, full_version)
+
+    def test_window_reuses_the_blocks(self):
+        # With historical volatility every row depends only on its own block
+        book = chain_refresh.ChainBook("STUB", "hv")
+        snap = snapshot()
+        full, _ = book.refresh(snap, EXPIRATIONS, self.provider)
+        window = EXPIRATIONS[2:5]
+        chain, _ = book.refresh(snap, window, self.provider)
+        self.assertEqual(self.provider.requests, {expiration: 1 for expiration in EXPIRATIONS})
+        expected = full[full["expiration"].isin(pd.to_datetime(window))].reset_index(drop=True)
+        pd.testing.assert_frame_equal(chain, expected, check_exact=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+"""
+Parity tests of the vectorized analytics kernels in utils.py against the scalar formulas they replace.
+Run from the repository root: python -m pytest tests
+"""
+
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import utils
+
+
+def random_chain(size=200, market_price=100.0, seed=0):
+    """Synthetic chain of calls around market_price: strikes, premiums and days to expiration."""
+    rng = np.random.default_rng(seed)
+    strikes = np.round(market_price * rng.uniform(0.6, 1.6, size), 2)
+    premiums = np.round(rng.uniform(0.05, 15.0, size), 2)
+    days = rng.integers(1, 400, size).astype(float)
+    return strikes, premiums, days
+
+
+class ComputeAARRBatchTest(unittest.TestCase):
+
+    def test_matches_compute_aarr(self):
+        strikes, premiums, days = random_chain()
+        finals = np.random.default_rng(1).uniform(50.0, 200.0, len(strikes))
+        for final_prices in (None, finals):
+            batch = utils.compute_aarr_batch(100, 100.0, strikes, premiums, days, final_market_price=final_prices)
+            for i in range(len(strikes)):
+                scalar = utils.compute_aarr(100, 100.0, strikes[i], premiums[i], days[i],
+                                            final_market_price=None if final_prices is None else final_prices[i])
+                np.testing.assert_allclose([column[i] for column in batch], scalar, rtol=1e-12)
+
+    def test_rejects_partial_contracts(self):
+        with self.assertRaises(ValueError):
+            utils.compute_aarr_batch(150, 100.0, [105.0], [1.0], [30])
+
+
+def scalar_price_probabilities(current_price, target_prices, days_to_expiry, volatility):
+    """The per-price loop calculate_price_probabilities replaced."""
+    if volatility is None or volatility <= 0:
+        return np.ones(len(target_prices)) / len(target_prices) * 100
+    t = days_to_expiry / 365.0
+    mu = -0.5 * volatility**2 * t
+    sigma = volatility * np.sqrt(t)
+    price_step = target_prices[1] - target_prices[0] if len(target_prices) > 1 else 1
+    probabilities = []
+    for price in target_prices:
+        if price <= 0:
+            probabilities.append(0)
+            continue
+        log_return = np.log(price / current_price)
+        density = np.exp(-0.5 * ((log_return - mu) / sigma)**2) / (sigma * np.sqrt(2 * np.pi))
+        probabilities.append(density * price_step / price)
+    probabilities = np.array(probabilities)
+    return probabilities / probabilities.sum() * 100
+
+
+class PriceProbabilitiesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.prices = np.linspace(-10.0, 250.0, 131)
+        self.days = np.array([1.0, 7.0, 30.0, 180.0, 365.0])
+        self.volatility = np.array([0.15, 0.4, np.nan, 0.8, 0.0])
+
+    def test_matches_scalar_loop(self):
+        for d, v in zip(self.days, [0.15, 0.4, None, 0.8, 0.0]):
+            np.testing.assert_allclose(utils.calculate_price_probabilities(100.0, self.prices, d, v),
+                                       scalar_price_probabilities(100.0, self.prices, d, v), rtol=1e-10, atol=1e-300)
+
+    def test_batch_rows_match_single_calls(self):
+        for exact in (False, True):
+            batch = utils.calculate_price_probabilities(100.0, self.prices, self.days, self.volatility, exact=exact)
+            self.assertEqual(batch.shape, (len(self.days), len(self.prices)))
+            for row, d, v in zip(batch, self.days, self.volatility):
+                np.testing.assert_allclose(row, utils.calculate_price_probabilities(100.0, self.prices, d, v, exact=exact),
+                                           rtol=1e-12)
+
+    def test_exact_bins_are_cdf_masses(self):
+        # Bins are [price - step/2, price + step/2], renormalized over the positive grid
+        prices = np.linspace(50.0, 200.0, 61)
+        step = prices[1] - prices[0]
+        t = 30 / 365.0
+        sigma = 0.3 * np.sqrt(t)
+        cdf = utils.normal_cdf((np.log(np.concatenate([prices - step / 2, prices[-1:] + step / 2]) / 100.0)
+                                + 0.5 * sigma**2) / sigma)
+        masses = np.diff(cdf)
+        np.testing.assert_allclose(utils.calculate_price_probabilities(100.0, prices, 30, 0.3, exact=True),
+                                   masses / masses.sum() * 100, rtol=1e-10)
+
+
+class NormalizeSafetyScoresTest(unittest.TestCase):
+
+    def test_matches_normalize_safety_score(self):
+        rng = np.random.default_rng(3)
+        # Ties, zeros (clipped raw scores) and a missing score
+        scores = np.concatenate([np.round(rng.uniform(0, 20, 300), 1), np.zeros(20), [np.nan]])
+        rng.shuffle(scores)
+        np.testing.assert_array_equal(utils.normalize_safety_scores(scores),
+                                      [utils.normalize_safety_score(score, scores) for score in scores])
+
+    def test_empty(self):
+        self.assertEqual(len(utils.normalize_safety_scores([])), 0)
+
+
+class ComputeGreeksTest(unittest.TestCase):
+
+    def setUp(self):
+        self.strikes, self.premiums, self.days = random_chain()
+        self.volatility = np.random.default_rng(4).uniform(0.1, 0.9, len(self.strikes))
+        self.volatility[::10] = np.nan
+
+    def test_safety_and_delta_match_scalar_formulas(self):
+        greeks = utils.compute_greeks(self.strikes, self.premiums, 100.0, self.days, self.volatility, r=0.04)
+        with mock.patch.object(utils, "get_risk_free_rate", return_value=0.04):
+            for i, (k, p, d, v) in enumerate(zip(self.strikes, self.premiums, self.days, self.volatility)):
+                v = None if np.isnan(v) else v
+                self.assertAlmostEqual(greeks["safety_score_raw"][i],
+                                       utils.calculate_safety_score(k, p, 100.0, d, v), places=10)
+                self.assertAlmostEqual(greeks["delta"][i],
+                                       utils.black_scholes_delta(100.0, k, d / 365.0, 0.04, v or 0.20), places=12)
+
+    def test_greeks_are_black_scholes_derivatives(self):
+        volatility = np.nan_to_num(self.volatility, nan=0.20)
+        greeks = utils.compute_greeks(self.strikes, self.premiums, 100.0, self.days, volatility, r=0.04)
+        t = self.days / 365.0
+
+        def price(spot=100.0, years=t, sigma=volatility):
+            return utils.black_scholes_call_price(spot, self.strikes, years, 0.04, sigma)
+
+        h = 1e-3
+        np.testing.assert_allclose(greeks["delta"], (price(100.0 + h) - price(100.0 - h)) / (2 * h), atol=1e-6)
+        np.testing.assert_allclose(greeks["gamma"], (price(100.0 + h) - 2 * price() + price(100.0 - h)) / h**2,
+                                   atol=1e-4)
+        dv = 1e-5
+        np.testing.assert_allclose(greeks["vega"], (price(sigma=volatility + dv) - price(sigma=volatility - dv)) / (2 * dv) / 100,
+                                   atol=1e-6)
+        np.testing.assert_allclose(greeks["theta"], -(price(years=t + h / 365) - price(years=t - h / 365)) / (2 * h),
+                                   atol=1e-6)
+        np.testing.assert_allclose(greeks["prob_assignment"],
+                                   utils.normal_cdf(utils.get_norm().ppf(greeks["delta"]) - volatility * np.sqrt(t)),
+                                   atol=1e-9)
+
+
+class ExpectedAARRBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.strikes, self.premiums, self.days = random_chain(size=60)
+        self.volatility = np.random.default_rng(2).uniform(0.1, 0.9, len(self.strikes))
+
+    def test_grid_matches_compute_expected_aarr_for_call(self):
+        # Small chunks so the chain spans several blocks
+        chunk_size, utils.EXPECTED_AARR_CHUNK_SIZE = utils.EXPECTED_AARR_CHUNK_SIZE, 7
+        try:
+            batch = utils.compute_expected_aarr_batch(self.strikes, self.premiums, self.days, 100.0, self.volatility)
+        finally:
+            utils.EXPECTED_AARR_CHUNK_SIZE = chunk_size
+        scalar = [utils.compute_expected_aarr_for_call(k, p, d, 100.0, v)
+                  for k, p, d, v in zip(self.strikes, self.premiums, self.days, self.volatility)]
+        np.testing.assert_allclose(batch, scalar, rtol=1e-9)
+
+    def test_exact_matches_integral_over_lognormal(self):
+        # Reference: the AARR payoff integrated against the lognormal density on a fine grid of z
+        z = np.linspace(-12, 12, 20001)
+        density = np.exp(-z**2 / 2) / np.sqrt(2 * np.pi)
+        exact = utils.compute_expected_aarr_batch(self.strikes, self.premiums, self.days, 100.0, self.volatility,
+                                                  method="exact")
+        for i, (k, p, d, v) in enumerate(zip(self.strikes, self.premiums, self.days, self.volatility)):
+            t = d / 365.0
+            final_prices = 100.0 * np.exp(-0.5 * v**2 * t + v * np.sqrt(t) * z)
+            aarr, *_ = utils.compute_aarr_batch(100, 100.0, k, p, d, final_market_price=final_prices)
+            self.assertAlmostEqual(exact[i], np.trapezoid(aarr * density, z), delta=1e-4 * max(1, abs(exact[i])))
+
+    def test_falls_back_to_strike_out_aarr(self):
+        volatility = np.where(np.arange(len(self.strikes)) % 2, self.volatility, np.nan)
+        for method in ("grid", "exact"):
+            batch = utils.compute_expected_aarr_batch(self.strikes, self.premiums, self.days, 100.0, volatility,
+                                                      method=method)
+            for i in range(0, len(self.strikes), 2):
+                aarr, *_ = utils.compute_aarr(100, 100.0, self.strikes[i], self.premiums[i], self.days[i])
+                self.assertAlmostEqual(batch[i], aarr, places=9)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            utils.compute_expected_aarr_batch(self.strikes, self.premiums, self.days, 100.0, 0.3, method="mc")
+
+
+if __name__ == "__main__":
+    unittest.main()
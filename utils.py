@@ -1,11 +1,38 @@
-from rich.console import Console
-from rich.markdown import Markdown
-from scipy.stats import norm
-import yfinance as yf
 import numpy as np
-import streamlit as st
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+import time
 import pandas as pd
+from providers import get_provider
+from instrumentation import span, traced
+from caching import ttl_cache
+import async_data
+
+# Daily history downloaded once per ticker for every historical volatility window
+HISTORY_PERIOD = "2y"
+
+# Final-price grid used for expected AARR: number of points and range as multiples of the market price
+EXPECTED_AARR_GRID_POINTS = 100
+EXPECTED_AARR_GRID_RANGE = (0.5, 2.0)
+
+# Contracts per block when computing expected AARR for a whole chain (bounds the contracts x grid matrix)
+EXPECTED_AARR_CHUNK_SIZE = 20000
+
+# Gauss-Legendre nodes for the below-strike integral in exact mode
+EXACT_QUADRATURE_NODES = 96
+
+def get_norm():
+    """scipy.stats.norm, imported on first use (scipy.stats takes about a second to import)."""
+    from scipy.stats import norm
+    return norm
+
+def normal_cdf(x):
+    """
+    Standard normal CDF: scipy.special.ndtr, the function norm.cdf evaluates, without norm's per-call
+    argument handling (~70us, it dominates scalar call sites). Imported on first use.
+    """
+    from scipy.special import ndtr
+    return ndtr(x)
 
 def get_api_key():
     with open("keys.txt", "r") as f:
@@ -15,43 +42,146 @@ def black_scholes_delta(S, K, T, r, sigma, call=True):
     """Estimate delta for an option."""
     d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
     if call:
-        return norm.cdf(d1)
+        return normal_cdf(d1)
     else:
-        return norm.cdf(d1) - 1
+        return normal_cdf(d1) - 1
     
+def black_scholes_call_price(S, K, T, r, sigma):
+    """Black-Scholes price of a European call (vectorized over any of the arguments)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sqrt_t = np.sqrt(T)
+        d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * sqrt_t)
+        d2 = d1 - sigma * sqrt_t
+    return S * normal_cdf(d1) - K * np.exp(-r * T) * normal_cdf(d2)
+
 def pretty_print(header, text):
+    # rich is only needed here, don't pay for it on import
+    from rich.console import Console
+    from rich.markdown import Markdown
     console = Console()
     console.print(f"[bold cyan]📈 {header}[/bold cyan]")
     console.print(Markdown(text))
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """Per-ticker market data fetched once per refresh and shared by every lookup."""
+    ticker: str
+    spot: float  # last close (today's price during the session)
+    history: pd.DataFrame  # daily OHLC over HISTORY_PERIOD
+    expirations: tuple  # available option expirations ('YYYY-MM-DD')
+    risk_free_rate: float
+    fetched_at: float  # unix time
+
+@ttl_cache(ttl=300)  # Cache for 5 minutes
+@traced("get_market_snapshot")
+def get_market_snapshot(ticker):
+    """
+    Fetch spot, daily history, option expirations and the risk-free rate for a ticker in one go.
+    The three upstream requests run concurrently (async_data).
+    """
+    provider = get_provider()
+
+    def history():
+        with span("upstream.history"):
+            return provider.history(ticker, period=HISTORY_PERIOD)
+
+    def expirations():
+        try:
+            with span("upstream.expirations"):
+                return tuple(provider.expirations(ticker))
+        except Exception as e:
+            print(f"Error fetching expirations for {ticker}: {e}")
+            return ()
+
+    history, expirations, risk_free_rate = async_data.call_concurrently(history, expirations, get_risk_free_rate)
+    return MarketSnapshot(
+        ticker=ticker.upper(),
+        spot=float(history['Close'].iloc[-1]),
+        history=history,
+        expirations=expirations,
+        risk_free_rate=risk_free_rate,
+        fetched_at=time.time(),
+    )
+
 def get_market_price(ticker):
     """Fetch the current market price of a stock."""
     try:
-        stock = yf.Ticker(ticker)
-        return stock.history(period="1d")['Close'].iloc[-1]
+        return get_market_snapshot(ticker).spot
     except Exception as e:
-        st.error(f"Error fetching market price for {ticker}: {e}")
+        print(f"Error fetching market price for {ticker}: {e}")
         return None
 
-@st.cache_data(ttl=300)
-def get_historical_volatility(ticker, days=30):
-    """Calculate historical volatility (annualized) from recent price data."""
-    try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period=f"{days}d")
-        if len(hist) < 2:
-            return None
-        
-        # Calculate daily returns
-        returns = hist['Close'].pct_change().dropna()
-        
+def historical_volatilities(history, windows):
+    """
+    Annualized historical volatility for several windows (in calendar days, like yfinance's "30d" period)
+    from one daily price history. Uses the std of daily log returns over each trailing window.
+    All windows come out of one pass: suffix sums of the returns and squared returns.
+    Returns {window: volatility or None (fewer than 2 returns in the window)}.
+    """
+    close = history['Close'].dropna()
+    if len(close) < 2:
+        return {window: None for window in windows}
+
+    log_returns = np.diff(np.log(close.to_numpy(dtype=float)))
+    # Sums over the last m returns, for every m
+    suffix_sum = np.concatenate([[0.0], np.cumsum(log_returns[::-1])])
+    suffix_sq_sum = np.concatenate([[0.0], np.cumsum(log_returns[::-1] ** 2)])
+
+    # Number of returns inside each window: bars dated after (last bar - window days), minus one
+    dates = close.index
+    starts = dates[-1] - pd.to_timedelta(np.asarray(windows, dtype=float), unit="D")
+    counts = len(dates) - dates.searchsorted(starts, side="right") - 1
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m = counts.astype(float)
+        variance = (suffix_sq_sum[counts] - suffix_sum[counts] ** 2 / m) / (m - 1)
         # Annualize volatility (252 trading days per year)
-        volatility = returns.std() * np.sqrt(252)
-        return volatility
+        volatility = np.sqrt(np.maximum(variance, 0)) * np.sqrt(252)
+
+    return {
+        window: (float(vol) if count >= 2 else None)
+        for window, vol, count in zip(windows, volatility, counts)
+    }
+
+def trailing_historical_volatility(history, window):
+    """
+    historical_volatilities(history up to each bar, [window]) for every bar at once, as an array
+    aligned with history (NaN where the window holds fewer than 2 returns). Prefix sums of the
+    returns and squared returns give every trailing window in one pass.
+    """
+    close = history['Close'].to_numpy(dtype=float)
+    log_returns = np.diff(np.log(close))
+    prefix_sum = np.concatenate([[0.0], np.cumsum(log_returns)])
+    prefix_sq_sum = np.concatenate([[0.0], np.cumsum(log_returns ** 2)])
+
+    # Returns inside the window ending at bar i: those of the bars dated after (bar i - window days)
+    dates = history.index
+    first = dates.searchsorted(dates - pd.to_timedelta(window, unit="D"), side="right")
+    ends = np.arange(len(close))
+    counts = ends - first
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m = counts.astype(float)
+        window_sum = prefix_sum[ends] - prefix_sum[first]
+        window_sq_sum = prefix_sq_sum[ends] - prefix_sq_sum[first]
+        variance = (window_sq_sum - window_sum ** 2 / m) / (m - 1)
+        # Annualize volatility (252 trading days per year)
+        volatility = np.sqrt(np.maximum(variance, 0)) * np.sqrt(252)
+    return np.where(counts >= 2, volatility, np.nan)
+
+@ttl_cache(ttl=300)
+@traced("get_historical_volatilities")
+def get_historical_volatilities(ticker, windows):
+    """Historical volatility for every window in `windows` (a tuple of day counts), memoized per set of windows."""
+    try:
+        return historical_volatilities(get_market_snapshot(ticker).history, windows)
     except Exception as e:
         print(f"Error calculating volatility: {e}")
-        return None
+        return {window: None for window in windows}
+
+def get_historical_volatility(ticker, days=30):
+    """Calculate historical volatility (annualized) from recent price data."""
+    return get_historical_volatilities(ticker, (days,))[days]
     
 def get_implied_volatility_from_options(ticker, days_to_expiry):
     """
@@ -59,18 +189,17 @@ def get_implied_volatility_from_options(ticker, days_to_expiry):
     More accurate than historical volatility for pricing.
     """
     try:
-        stock = yf.Ticker(ticker)
-        current_price = stock.history(period="1d")['Close'].iloc[-1]
+        snapshot = get_market_snapshot(ticker)
+        current_price = snapshot.spot
         
         # Find closest expiration
-        expirations = stock.options
+        expirations = snapshot.expirations
         target_date = datetime.today() + timedelta(days=days_to_expiry)
         closest_exp = min(expirations, 
                          key=lambda x: abs((pd.to_datetime(x) - target_date).days))
         
         # Get ATM call options
-        chain = stock.option_chain(closest_exp)
-        calls = chain.calls
+        calls = get_provider().option_calls(ticker, closest_exp)
         
         # Find ATM option (strike closest to current price)
         atm_call = calls.iloc[(calls['strike'] - current_price).abs().argsort()[:1]]
@@ -120,6 +249,62 @@ def calculate_safety_score(strike, premium, market_price, days_to_expiry, volati
     
     return safety
 
+def compute_greeks(strikes, premiums, market_price, days_to_expiry, volatility, r=None):
+    """
+    Greeks and raw safety score for a whole chain of calls at once.
+    d1/d2 are computed once per contract and shared by every column, and the risk-free rate
+    is looked up once per call (pass r to skip the lookup).
+
+    Returns a DataFrame with columns:
+    - delta, gamma
+    - theta (per calendar day), vega (per 1 volatility point)
+    - prob_assignment: risk-neutral probability of finishing in the money, N(d2)
+    - safety_score_raw: same value as calculate_safety_score for each row
+    """
+    strikes = np.asarray(strikes, dtype=float)
+    premiums = np.asarray(premiums, dtype=float)
+    days_to_expiry = np.asarray(days_to_expiry, dtype=float)
+    volatility = np.asarray(volatility if volatility is not None else np.nan, dtype=float)
+    strikes, premiums, days_to_expiry, volatility = np.broadcast_arrays(
+        np.atleast_1d(strikes), premiums, days_to_expiry, volatility
+    )
+
+    # Same default as calculate_safety_score when volatility is missing
+    volatility = np.where(volatility > 0, volatility, 0.20)
+
+    # Time in years
+    t = days_to_expiry / 365.0
+
+    # Risk-free rate
+    if r is None:
+        r = get_risk_free_rate()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sqrt_t = np.sqrt(t)
+        d1 = (np.log(market_price / strikes) + (r + 0.5 * volatility**2) * t) / (volatility * sqrt_t)
+        d2 = d1 - volatility * sqrt_t
+        pdf_d1 = get_norm().pdf(d1)
+
+        delta = normal_cdf(d1)
+        gamma = pdf_d1 / (market_price * volatility * sqrt_t)
+        theta = (-market_price * pdf_d1 * volatility / (2 * sqrt_t) - r * strikes * np.exp(-r * t) * normal_cdf(d2)) / 365
+        vega = market_price * pdf_d1 * sqrt_t / 100
+
+    # Safety score (see calculate_safety_score), delta as the probability of striking out
+    estimated_expiry_price = market_price * np.exp((r - 0.5 * volatility**2) * t)
+    strike_out_profit = (strikes + premiums - market_price) / market_price * 100
+    keep_shares_profit = (estimated_expiry_price + premiums - market_price) / market_price * 100
+    safety = (delta * strike_out_profit) + ((1 - delta) * keep_shares_profit)
+
+    return pd.DataFrame({
+        "delta": delta,
+        "gamma": gamma,
+        "theta": theta,
+        "vega": vega,
+        "prob_assignment": normal_cdf(d2),
+        "safety_score_raw": np.maximum(0, safety),
+    })
+
 def normalize_safety_score(raw_score, all_scores):
     """
     Normalize safety scores to 0-10 scale.
@@ -151,52 +336,102 @@ def normalize_safety_score(raw_score, all_scores):
     
     return round(score, 1)
 
-def calculate_price_probabilities(current_price, target_prices, days_to_expiry, volatility):
+def normalize_safety_scores(all_scores):
+    """
+    Column version of normalize_safety_score: normalizes every score against the whole column.
+    Sorts once and ranks with searchsorted (O(n log n)) instead of scanning the column per row.
+    Returns the same 0-10 values as calling normalize_safety_score for each element.
+    """
+    all_scores = np.asarray(all_scores, dtype=float)
+    if len(all_scores) == 0:
+        return np.array([], dtype=float)
+
+    # Number of scores strictly below each score (NaNs sort last and never count as below)
+    sorted_scores = np.sort(all_scores)
+    below = np.searchsorted(sorted_scores, all_scores, side="left")
+    below[np.isnan(all_scores)] = 0
+    percentile = below / len(all_scores) * 100
+
+    # Same piecewise percentile -> 0-10 mapping as normalize_safety_score
+    score = np.select(
+        [percentile >= 90, percentile >= 75, percentile >= 50, percentile >= 25, percentile >= 10],
+        [
+            9 + (percentile - 90) / 10,
+            7.5 + (percentile - 75) / 15 * 1.5,
+            5 + (percentile - 50) / 25 * 2.5,
+            2.5 + (percentile - 25) / 25 * 2.5,
+            1 + (percentile - 10) / 15 * 1.5,
+        ],
+        default=percentile / 10,
+    )
+
+    return np.round(score, 1)
+
+def calculate_price_probabilities(current_price, target_prices, days_to_expiry, volatility, exact=False):
     """
     Calculate probability of stock being within a small range around each target price.
     Uses log-normal distribution (Black-Scholes assumption).
     NOTE: assumes 100 shares (1 contract)
     Returns array of probabilities (as percentages) for each target price.
+
+    Batch use: target_prices can be a 2D array with one price grid per row, and days_to_expiry /
+    volatility can be one value per row. Each row is normalized to 100% on its own.
+    exact=True uses the lognormal mass of each price bin (CDF differences between bin edges)
+    instead of density x step.
     """
-    if volatility is None or volatility <= 0:
-        # Return uniform distribution if no volatility data
-        return np.ones(len(target_prices)) / len(target_prices) * 100
-    
+    target_prices = np.asarray(target_prices, dtype=float)
+    days_to_expiry = np.asarray(days_to_expiry, dtype=float)
+    volatility = np.asarray(volatility if volatility is not None else np.nan, dtype=float)
+    batch = target_prices.ndim > 1 or days_to_expiry.ndim > 0 or volatility.ndim > 0
+
+    # Work on (rows, grid) arrays; per-row parameters become columns
+    prices = np.atleast_2d(target_prices)
+    days_to_expiry = np.atleast_1d(days_to_expiry)[:, None]
+    volatility = np.atleast_1d(volatility)[:, None]
+    prices, days_to_expiry, volatility = np.broadcast_arrays(
+        prices, days_to_expiry, volatility
+    )
+
     # Time in years
     t = days_to_expiry / 365.0
-    
+
     # Expected log return (drift term, assuming risk-free rate ≈ 0 for simplicity)
     mu = -0.5 * volatility**2 * t  # Drift-adjusted mean for log-normal
     sigma = volatility * np.sqrt(t)
-    
-    # Calculate probability for small price ranges around each point
-    probabilities = []
-    price_step = target_prices[1] - target_prices[0] if len(target_prices) > 1 else 1
-    
-    for price in target_prices:
-        if price <= 0:
-            probabilities.append(0)
-            continue
-        
-        # Convert to log returns
-        log_return = np.log(price / current_price)
-        
-        # Calculate probability density using normal distribution
-        # (log returns are normally distributed)
-        prob_density = norm.pdf(log_return, loc=mu, scale=sigma)
-        
-        # Convert density to probability over the price interval
-        # Multiply by price_step to get probability mass
-        probability = prob_density * price_step / price
-        
-        probabilities.append(probability)
-    
-    # Normalize to sum to 100%
-    probs_array = np.array(probabilities)
-    if probs_array.sum() > 0:
-        probs_array = (probs_array / probs_array.sum()) * 100
-    
-    return probs_array
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if exact:
+            # Bin edges halfway between grid points, half a step past each end
+            if prices.shape[1] > 1:
+                half_steps = np.diff(prices, axis=1) / 2
+                edges = np.concatenate([
+                    prices[:, :1] - half_steps[:, :1],
+                    prices[:, :-1] + half_steps,
+                    prices[:, -1:] + half_steps[:, -1:],
+                ], axis=1)
+            else:
+                edges = np.concatenate([prices - 0.5, prices + 0.5], axis=1)
+            z_edges = (np.log(np.maximum(edges, 0) / current_price) - mu[:, :1]) / sigma[:, :1]
+            cdf = normal_cdf(z_edges)
+            probabilities = cdf[:, 1:] - cdf[:, :-1]
+        else:
+            # Density of the log return, converted to probability mass over the price interval
+            price_step = prices[:, 1:2] - prices[:, :1] if prices.shape[1] > 1 else 1
+            log_return = np.log(prices / current_price)
+            prob_density = get_norm().pdf(log_return, loc=mu, scale=sigma)
+            probabilities = prob_density * price_step / prices
+
+    probabilities = np.where(prices > 0, probabilities, 0.0)
+
+    # Return uniform distribution for rows with no volatility data
+    no_volatility = ~(volatility[:, 0] > 0)
+    probabilities[no_volatility] = 1.0
+
+    # Normalize each row to sum to 100%
+    totals = probabilities.sum(axis=1, keepdims=True)
+    probabilities = np.where(totals > 0, probabilities / np.where(totals > 0, totals, 1) * 100, probabilities)
+
+    return probabilities if batch else probabilities[0]
 
 def compute_aarr(num_shares, initial_market_price, strike_price, premium, expiry, strike_out=None, final_market_price=None):
     """Calculate annualized rate of return for a covered call position."""
@@ -228,6 +463,39 @@ def compute_aarr(num_shares, initial_market_price, strike_price, premium, expiry
     
     return aarr_compound, net_gain, start_money, end_money
 
+def compute_aarr_batch(num_shares, initial_market_price, strike_price, premium, expiry, final_market_price=None):
+    """
+    Vectorized compute_aarr. Every argument after num_shares can be a scalar or a NumPy array;
+    they are broadcast together and the same four values are returned as arrays.
+    If final_market_price is None every position is assumed to strike out (same as compute_aarr).
+    """
+    if num_shares % 100 != 0:
+        raise ValueError("Number of shares must be a multiple of 100 for AARR calculation.")
+
+    initial_market_price = np.asarray(initial_market_price, dtype=float)
+    strike_price = np.asarray(strike_price, dtype=float)
+    premium = np.asarray(premium, dtype=float)
+    expiry = np.asarray(expiry, dtype=float)
+
+    start_money = initial_market_price * num_shares
+
+    if final_market_price is None:
+        # Shares are always called away at strike price
+        final_value = strike_price
+    else:
+        final_market_price = np.asarray(final_market_price, dtype=float)
+        # Called away at strike if final >= strike, otherwise keep shares worth the final price
+        final_value = np.where(final_market_price >= strike_price, strike_price, final_market_price)
+
+    end_money = (final_value + premium) * num_shares
+    net_gain = end_money - start_money
+
+    # Same compound formula as compute_aarr, including the 3 settlement days
+    num_repeats = 365 / (expiry + 3)
+    aarr_compound = ((end_money / start_money) ** num_repeats - 1) * 100
+
+    return tuple(np.broadcast_arrays(aarr_compound, net_gain, start_money, end_money))
+
 def compute_hold_aarr(num_shares, initial_market_price, final_market_price, days):
     """Calculate AARR for simply holding the stock."""
     start_money = initial_market_price * num_shares
@@ -253,7 +521,8 @@ def compute_expected_aarr_for_call(strike, premium, days_to_expiry, market_price
         return aarr
     
     # Generate price range
-    price_range = np.linspace(market_price * 0.5, market_price * 2, 100)
+    low, high = EXPECTED_AARR_GRID_RANGE
+    price_range = np.linspace(market_price * low, market_price * high, EXPECTED_AARR_GRID_POINTS)
     probabilities = calculate_price_probabilities(market_price, price_range, days_to_expiry, volatility)
     
     # Calculate AARR at each price point. 
@@ -274,7 +543,87 @@ def compute_expected_aarr_for_call(strike, premium, days_to_expiry, market_price
     expected_aarr = np.average(aarr_values, weights=probabilities)
     return expected_aarr
 
-@st.cache_data(ttl=86400)  # Cache for 1 day
+def compute_expected_aarr_batch(strikes, premiums, days_to_expiry, market_price, volatility, method="grid",
+                                grid_points=EXPECTED_AARR_GRID_POINTS, grid_range=EXPECTED_AARR_GRID_RANGE, exact_bins=False):
+    """
+    Probability-weighted expected AARR for a whole chain in one broadcast (contracts x price grid).
+    volatility can be a scalar or one value per contract. Contracts without a usable volatility
+    (None/NaN/<= 0) or with no days left fall back to the max (strike-out) AARR, like compute_expected_aarr_for_call.
+
+    method="grid" gives the same numbers as compute_expected_aarr_for_call for the same grid settings.
+    method="exact" integrates the payoff against the full lognormal instead of a truncated grid.
+    exact_bins=True weights the grid with CDF bin masses (see calculate_price_probabilities).
+    """
+    strikes = np.atleast_1d(np.asarray(strikes, dtype=float))
+    premiums = np.atleast_1d(np.asarray(premiums, dtype=float))
+    days_to_expiry = np.atleast_1d(np.asarray(days_to_expiry, dtype=float))
+    volatility = np.atleast_1d(np.asarray(volatility if volatility is not None else np.nan, dtype=float))
+    strikes, premiums, days_to_expiry, volatility = np.broadcast_arrays(strikes, premiums, days_to_expiry, volatility)
+
+    # Fallback: simple AARR assuming the shares are called away
+    expected, *_ = compute_aarr_batch(100, market_price, strikes, premiums, days_to_expiry)
+    expected = expected.astype(float)
+
+    usable = np.isfinite(volatility) & (volatility > 0) & (days_to_expiry > 0)
+    rows = np.flatnonzero(usable)
+    if method == "grid":
+        low, high = grid_range
+        price_range = np.linspace(market_price * low, market_price * high, grid_points)
+        block = _expected_aarr_grid
+    elif method == "exact":
+        price_range = None
+        block = _expected_aarr_exact
+    else:
+        raise ValueError(f"Unknown expected AARR method: {method}")
+
+    for start in range(0, len(rows), EXPECTED_AARR_CHUNK_SIZE):
+        idx = rows[start:start + EXPECTED_AARR_CHUNK_SIZE]
+        expected[idx] = block(strikes[idx], premiums[idx], days_to_expiry[idx], market_price, volatility[idx],
+                              price_range, exact_bins=exact_bins)
+
+    return expected
+
+def _expected_aarr_grid(strikes, premiums, days_to_expiry, market_price, volatility, price_range, exact_bins=False):
+    """Weighted average of AARR over the price grid for one block of contracts."""
+    aarr, *_ = compute_aarr_batch(
+        100, market_price, strikes[:, None], premiums[:, None], days_to_expiry[:, None],
+        final_market_price=price_range[None, :]
+    )
+    weights = calculate_price_probabilities(market_price, price_range, days_to_expiry, volatility, exact=exact_bins)
+    return (aarr * weights).sum(axis=1) / weights.sum(axis=1)
+
+def _expected_aarr_exact(strikes, premiums, days_to_expiry, market_price, volatility, price_range=None, exact_bins=False):
+    """
+    Expected AARR against the full lognormal.
+    Above the strike the payoff is constant, so that branch is closed form (probability from the normal CDF).
+    Below the strike the compounded return (final + premium)^(365/days) has no closed form for
+    non-integer exponents, so it is integrated with Gauss-Legendre quadrature in log-return space.
+    """
+    t = days_to_expiry / 365.0
+    mu = -0.5 * volatility**2 * t
+    sigma = volatility * np.sqrt(t)
+    num_repeats = 365 / (days_to_expiry + 3)
+
+    # Standardized log return at which the shares get called away
+    z_strike = (np.log(strikes / market_price) - mu) / sigma
+
+    # Strike-out branch: constant growth factor times P(final >= strike)
+    called_growth = ((strikes + premiums) / market_price) ** num_repeats
+    expected_growth = called_growth * normal_cdf(-z_strike)
+
+    # Keep-shares branch: integrate over z in [z_low, z_strike] (mass below z_low is negligible)
+    z_low = np.minimum(-8.0, z_strike)
+    nodes, node_weights = np.polynomial.legendre.leggauss(EXACT_QUADRATURE_NODES)
+    half_width = (z_strike - z_low)[:, None] / 2
+    z = z_low[:, None] + half_width * (nodes[None, :] + 1)
+    final_prices = market_price * np.exp(mu[:, None] + sigma[:, None] * z)
+    growth = ((final_prices + premiums[:, None]) / market_price) ** num_repeats[:, None]
+    expected_growth += (growth * get_norm().pdf(z) * node_weights[None, :]).sum(axis=1) * half_width[:, 0]
+
+    return (expected_growth - 1) * 100
+
+@ttl_cache(ttl=86400)  # Cache for 1 day
+@traced("get_risk_free_rate")
 def get_risk_free_rate():
     """
     Fetch current 3-month US Treasury rate as risk-free rate proxy.
@@ -282,8 +631,7 @@ def get_risk_free_rate():
     """
     try:
         # Use ^IRX (13-week Treasury Bill rate)
-        treasury = yf.Ticker("^IRX")
-        rate = treasury.history(period="1d")['Close'].iloc[-1] / 100  # Convert from percentage
+        rate = get_provider().history("^IRX", period="1d")['Close'].iloc[-1] / 100  # Convert from percentage
         return rate if rate > 0 else 0.04
     except:
         return 0.04  # Default fallback
\ No newline at end of file